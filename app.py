@@ -4,18 +4,33 @@ from pathlib import Path
 from uuid import uuid4
 from datetime import datetime
 import json
+import os
 import random
 import pytz
 
+from export_bundle import FORMATS, MAX_DOWNLOAD_BYTES, bundle_bytes, estimate_bundle_bytes
+from name_index import NameIndex, similar_items
+from snapshots import list_snapshots, restore_snapshot, take_snapshot
+from spaces import SPACE_CACHE, get_space
+from tiering import HOT_DAYS, iter_archive, iter_with_archive, load_archive, maybe_retier, remove_archived, with_archive
+
 # ---------------- CONFIG ----------------
 st.set_page_config(page_title="我们的专属小站", page_icon="💖", layout="wide")
 
-DATA_FILE = "data.csv"
-MSG_FILE = "messages.csv"
-LOTTERY_FILE = "lottery.json"
-WISH_FILE = "wishes.json"
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+# 空间：?space=名字 选择数据目录和用户；不带参数就是当前目录
+try:
+    SPACE = get_space(st.query_params.get("space", ""))
+except (ValueError, FileNotFoundError) as e:
+    st.error(str(e))
+    st.stop()
+
+DATA_FILE = SPACE.data_file
+MSG_FILE = SPACE.msg_file
+LOTTERY_FILE = SPACE.lottery_file
+WISH_FILE = SPACE.wish_file
+UPLOAD_DIR = SPACE.upload_dir
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+USERS = list(SPACE.users)
 
 COLUMNS = [
     "时间", "用户", "物品类型", "名称", "链接", "情境",
@@ -23,6 +38,8 @@ COLUMNS = [
     "最终分", "最终推荐", "愉悦度", "备注", "照片文件名", "记录ID"
 ]
 
+RATING_COLUMNS = ["主评级1", "次评级1", "主评级2", "次评级2"]
+
 BASE_TYPES = ["外卖", "生活用品", "化妆品", "数码", "小事", "其他"]
 
 SUB_MAP = {"S": ["S+", "S", "S-"], "A": ["A+", "A", "A-"], "B": ["B+", "B", "B-"], "C": ["C+", "C", "C-"]}
@@ -40,6 +57,21 @@ def now_str():
     return datetime.now(tz).strftime("%Y-%m-%d %H:%M:%S")
 
 
+def replace_file(path, write):
+    # 先写临时文件再替换：别的会话同时在读时不会读到写了一半的文件
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{uuid4().hex}.tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _write_json(obj):
+    def write(path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False, indent=2)
+    return write
+
+
 def load_data():
     if Path(DATA_FILE).exists():
         df = pd.read_csv(DATA_FILE, encoding="utf-8-sig")
@@ -49,13 +81,23 @@ def load_data():
         if "记录ID" not in df.columns:
             df["记录ID"] = ""
         df["记录ID"] = df["记录ID"].apply(lambda x: x if isinstance(x, str) and x.strip() else uuid4().hex)
+        # 二次评级列可能整列为空，read_csv 会读成 float64，之后写入 "S" 会报错
+        for c in RATING_COLUMNS:
+            df[c] = df[c].fillna("").astype(str)
         return df[COLUMNS]
     else:
         return pd.DataFrame(columns=COLUMNS)
 
 
+def load_hot_data():
+    # 加载前顺便把过期的记录搬进归档（每天最多一次），data.csv 保持只有热数据
+    maybe_retier(SPACE.root, HOT_DAYS)
+    return load_data()
+
+
 def save_data(df):
-    df.to_csv(DATA_FILE, index=False, encoding="utf-8-sig")
+    replace_file(DATA_FILE, lambda p: df.to_csv(p, index=False, encoding="utf-8-sig"))
+    st.session_state.df_version = SPACE_CACHE.put(SPACE.name, df)
 
 
 def load_messages():
@@ -68,7 +110,7 @@ def save_message(text):
     dfm = load_messages()
     new = {"时间": now_str(), "留言": text}
     dfm = pd.concat([dfm, pd.DataFrame([new])], ignore_index=True)
-    dfm.to_csv(MSG_FILE, index=False, encoding="utf-8-sig")
+    replace_file(MSG_FILE, lambda p: dfm.to_csv(p, index=False, encoding="utf-8-sig"))
 
 
 def load_lottery():
@@ -79,8 +121,7 @@ def load_lottery():
 
 
 def save_lottery(d):
-    with open(LOTTERY_FILE, "w", encoding="utf-8") as f:
-        json.dump(d, f, ensure_ascii=False, indent=2)
+    replace_file(LOTTERY_FILE, _write_json(d))
 
 
 def load_wishes():
@@ -91,8 +132,21 @@ def load_wishes():
 
 
 def save_wishes(wishes):
-    with open(WISH_FILE, "w", encoding="utf-8") as f:
-        json.dump(wishes, f, ensure_ascii=False, indent=2)
+    replace_file(WISH_FILE, _write_json(wishes))
+
+
+def build_name_index(hot):
+    # 逐个归档分区加入，最后加热数据（同一记录ID以热数据为准），不拼整份历史
+    idx = NameIndex()
+    for part in iter_archive(SPACE.root):
+        idx.update(part)
+    return idx.update(hot)
+
+
+def get_name_index():
+    # 同一空间的会话共用一份，放在 SPACE_CACHE 的条目里计入内存上限；
+    # 保存 / 二次评级 / 删除时就地增量更新，其他会话保存后不用重建
+    return SPACE_CACHE.derived(SPACE.name, "name_index", build_name_index, load_hot_data)
 
 
 def save_uploaded_image(uploaded_file):
@@ -104,8 +158,15 @@ def save_uploaded_image(uploaded_file):
 
 
 # ---------------- Session init ----------------
-if "df" not in st.session_state:
-    st.session_state.df = load_data()
+# 同一空间的会话共用进程里缓存的那份记录；别的会话保存后版本号变了就换成新的
+if st.session_state.get("space") != SPACE.name:
+    for k in ("df", "df_version", "images"):
+        st.session_state.pop(k, None)
+    st.session_state.space = SPACE.name
+cached_df, cached_version = SPACE_CACHE.get(SPACE.name, load_hot_data)
+if "df" not in st.session_state or st.session_state.get("df_version") != cached_version:
+    st.session_state.df = cached_df
+    st.session_state.df_version = cached_version
 if "images" not in st.session_state:
     st.session_state.images = {p.name: str(p) for p in UPLOAD_DIR.glob("*")}
 if "theme" not in st.session_state:
@@ -123,6 +184,64 @@ with st.sidebar:
     theme = st.selectbox("主题切换", ["樱粉清新", "夜间黑银", "极光薄荷"])
     st.session_state.theme = theme
 
+    # 导出：点击下载时才打包（在后台线程里跑），归档逐月读、分块写临时文件，打完就删。
+    # streamlit 会把整个包放在内存里交给浏览器，估计超过上限的改用命令行导出
+    st.markdown("---")
+    st.subheader("📦 导出")
+    exp_range = st.date_input("日期范围（可选）", value=(), key="export_range")
+    exp_user = st.selectbox("导出哪个用户", ["全部"] + USERS, key="export_user")
+    exp_fmt = st.selectbox("记录格式", FORMATS, key="export_fmt")
+    exp_photos = st.checkbox("包含照片", value=True, key="export_photos")
+    exp_start = exp_range[0] if len(exp_range) > 0 else None
+    exp_end = exp_range[1] if len(exp_range) > 1 else exp_start
+    exp_user = None if exp_user == "全部" else exp_user
+    exp_size = estimate_bundle_bytes(DATA_FILE, SPACE.root, MSG_FILE, UPLOAD_DIR, exp_start, exp_end, exp_photos)
+    if exp_size > MAX_DOWNLOAD_BYTES:
+        cli = f"python export_bundle.py --data {DATA_FILE} --messages {MSG_FILE} --wishes {WISH_FILE} " \
+              f"--lottery {LOTTERY_FILE} --uploads {UPLOAD_DIR} --format {exp_fmt}"
+        cli += f" --since {exp_start} --until {exp_end}" if exp_start else ""
+        cli += f" --user {exp_user}" if exp_user else ""
+        cli += "" if exp_photos else " --no-photos"
+        st.warning(f"导出内容可能有 {exp_size / 2**20:.0f} MB，超过网页下载上限 "
+                   f"{MAX_DOWNLOAD_BYTES / 2**20:.0f} MB，请缩小日期范围、不含照片，或在服务器上运行：")
+        st.code(cli, language="bash")
+    else:
+        # 回调里不能用 st.*，需要的值都在这里先取出来
+        exp_records = st.session_state.df
+        st.download_button(
+            "📥 下载导出包",
+            data=lambda: bundle_bytes(
+                iter_with_archive(exp_records, SPACE.root, exp_start, exp_end), fmt=exp_fmt,
+                msg_file=MSG_FILE, wish_file=WISH_FILE, lottery_file=LOTTERY_FILE,
+                upload_dir=UPLOAD_DIR, start=exp_start, end=exp_end,
+                user=exp_user, include_photos=exp_photos,
+            ),
+            file_name="我们的小站导出.zip", mime="application/zip", on_click="ignore",
+        )
+
+    # 快照：删除等操作前会自动存一份，这里可以回到任意时间点
+    st.markdown("---")
+    st.subheader("🕰 快照")
+    if st.button("立即快照"):
+        take_snapshot(SPACE.root, reason="手动快照")
+        st.success("已保存快照")
+    snaps = list_snapshots(SPACE.root)
+    if snaps:
+        snap_sel = st.selectbox(
+            "选择快照", [s["id"] for s in reversed(snaps)],
+            format_func=lambda sid: next(f"{s['时间']} · {s['说明']}" for s in snaps if s["id"] == sid),
+        )
+        if st.button("恢复到此快照"):
+            changed, removed = restore_snapshot(snap_sel, SPACE.root)
+            # 丢掉缓存，rerun 时从磁盘重新加载（其他会话也会跟着刷新）
+            SPACE_CACHE.drop(SPACE.name)
+            st.session_state.pop("df", None)
+            st.session_state.images = {p.name: str(p) for p in UPLOAD_DIR.glob("*")}
+            st.success(f"已恢复：写回 {changed} 个文件，删除 {removed} 个文件")
+            st.rerun()
+    else:
+        st.caption("还没有快照")
+
 
 # ---------------- Theme CSS ----------------
 def get_theme_css(name):
@@ -158,13 +277,37 @@ left, right = st.columns([1, 1.25])
 with left:
    with left:
     st.subheader("➕ 添加记录")
+    if "flash" in st.session_state:
+        ok_text, info_text = st.session_state.pop("flash")
+        st.success(ok_text)
+        if info_text:
+            st.info(info_text)
+    # 名称放在表单外面：输入后立即刷新，显示相似的历史物品
+    if st.session_state.pop("clear_name", False):
+        st.session_state.input_name = ""
+    name = st.text_input("名称/事件", key="input_name")
+
+    # 检查是否存在相似的历史记录（三元组索引，忽略空格/标点/大小写）
+    update_mode = False
+    target_id = target_time = None
+    if name.strip():
+        hits = similar_items(get_name_index(), name)
+        if hits:
+            st.info(f"检测到 {len(hits)} 个相似的历史物品")
+            labels = ["创建新条目"] + [f"{h['名称']} · 最终分 {h['最终分']} · {h['时间']}（共 {h['条数']} 条）" for h in hits]
+            choice = st.radio("把这次作为二次评级更新哪一条？", range(len(labels)), index=0,
+                              format_func=lambda i: labels[i], key="op_target")
+            if choice:
+                update_mode = True
+                target_id = hits[choice - 1]["记录ID"]
+                target_time = hits[choice - 1]["时间"]
+
     with st.form("add_form", clear_on_submit=True):
         # 选择用户
-        user = st.selectbox("选择用户", ["uuu","ooo"], index=0)
+        user = st.selectbox("选择用户", USERS, index=0)
 
         # 物品/事件信息
         itype = st.selectbox("类型", options=BASE_TYPES)
-        name = st.text_input("名称/事件", key="input_name")
         link = st.text_input("链接（可选）", key="input_link")
         ctx = st.selectbox("情境", ["在家","通勤","旅行","工作","约会","其他"], key="input_ctx")
 
@@ -172,25 +315,10 @@ with left:
         main1 = st.selectbox("主评级1", ["S","A","B","C"], key="main1")
         sub1 = st.selectbox("细分1", SUB_MAP[main1], key="sub1")
 
-        # 检查是否存在历史同名记录
-        update_mode = False
-        existing_latest_idx = None
-        if name.strip():
-            df_all = st.session_state.get("df", pd.DataFrame(columns=COLUMNS))
-            mask = df_all["名称"].fillna("").str.lower() == name.strip().lower()
-            if mask.any():
-                existing = df_all[mask].copy()
-                existing["__time_parsed"] = pd.to_datetime(existing["时间"], errors="coerce")
-                existing = existing.sort_values("__time_parsed")
-                latest_row = existing.iloc[-1]
-                st.info(f"检测到历史记录（共 {existing.shape[0]} 条）")
-                op = st.radio("操作选项", ("创建新条目","把这次作为二次评级更新最近一条记录"), index=0, key="op_mode")
-                if op == "把这次作为二次评级更新最近一条记录":
-                    update_mode = True
-                    existing_latest_idx = latest_row.name
-                    st.markdown("将把此次输入作为**二次评级**更新最近一条同名记录。")
-                    main2 = st.selectbox("主评级2（用于更新）", ["S","A","B","C"], key="main2")
-                    sub2 = st.selectbox("细分2（用于更新）", SUB_MAP[main2], key="sub2")
+        if update_mode:
+            st.markdown("将把此次输入作为**二次评级**更新所选的那条记录。")
+            main2 = st.selectbox("主评级2（用于更新）", ["S","A","B","C"], key="main2")
+            sub2 = st.selectbox("细分2（用于更新）", SUB_MAP[main2], key="sub2")
 
         mood = st.radio("愉悦度", ["愉悦","还行","不愉悦"], index=1, key="mood_input")
         remark = st.text_area("备注", key="remark_input")
@@ -202,9 +330,23 @@ with left:
         if not name.strip():
             st.warning("请输入名称！")
         else:
-            if update_mode and existing_latest_idx is not None:
-                df_all = st.session_state.df
-                prev_sub1 = df_all.at[existing_latest_idx,"次评级1"]
+            if update_mode and target_id is not None:
+                # 缓存里的 DataFrame 被所有会话共享，先复制再改
+                df_all = st.session_state.df.copy()
+                # 选中的是归档记录：更新后时间变成现在，搬回热数据
+                archived = not (df_all["记录ID"] == target_id).any()
+                if archived:
+                    # 只读这条记录所在月份的分区
+                    month = pd.to_datetime(target_time, errors="coerce")
+                    month = None if pd.isna(month) else month
+                    arch = load_archive(SPACE.root, month, month)
+                    if not arch.empty:
+                        row = arch[arch["记录ID"] == target_id].reindex(columns=COLUMNS)
+                        df_all = pd.concat([df_all, row], ignore_index=True)
+                # 提交时再按记录ID找行：从选中到提交之间行标签可能已经变了
+                matched = df_all.index[df_all["记录ID"] == target_id]
+                row_idx = matched[0] if len(matched) else None
+                prev_sub1 = df_all.at[row_idx,"次评级1"] if row_idx is not None else None
                 v1 = SCORE_MAP.get(prev_sub1)
                 v2 = SCORE_MAP.get(sub2)
                 if v1 is None or v2 is None:
@@ -212,18 +354,23 @@ with left:
                 else:
                     final_score = round(w1*v1 + w2*v2,3)
                     rec = "推荐" if final_score>=4.2 else ("还行" if final_score>=3.0 else "不推荐")
-                    df_all.at[existing_latest_idx,"主评级2"] = main2
-                    df_all.at[existing_latest_idx,"次评级2"] = sub2
-                    df_all.at[existing_latest_idx,"最终分"] = final_score
-                    df_all.at[existing_latest_idx,"最终推荐"] = rec
-                    df_all.at[existing_latest_idx,"时间"] = now_str()
-                    df_all.at[existing_latest_idx,"用户"] = user
+                    df_all.at[row_idx,"主评级2"] = main2
+                    df_all.at[row_idx,"次评级2"] = sub2
+                    df_all.at[row_idx,"最终分"] = final_score
+                    df_all.at[row_idx,"最终推荐"] = rec
+                    df_all.at[row_idx,"时间"] = now_str()
+                    df_all.at[row_idx,"用户"] = user
                     if photo:
                         fn = save_uploaded_image(photo)
-                        df_all.at[existing_latest_idx,"照片文件名"] = fn
+                        df_all.at[row_idx,"照片文件名"] = fn
                     save_data(df_all)
+                    if archived:
+                        # 先写热数据再删归档：中途出错时读的时候以热数据为准
+                        remove_archived(SPACE.root, [target_id])
                     st.session_state.df = df_all
-                    st.success("已更新最近一条记录（作为二次评级）")
+                    get_name_index().add(df_all.at[row_idx,"名称"], target_id, final_score, df_all.at[row_idx,"时间"])
+                    st.session_state.clear_name = True
+                    st.session_state.flash = ("已更新所选记录（作为二次评级）", None)
                     st.rerun()
             else:
                 v1 = SCORE_MAP.get(sub1)
@@ -250,11 +397,14 @@ with left:
                 }
                 st.session_state.df = pd.concat([st.session_state.df, pd.DataFrame([new_row])], ignore_index=True)
                 save_data(st.session_state.df)
-                st.success("已保存新记录！")
+                get_name_index().add(name, new_row["记录ID"], final_score, new_row["时间"])
+                # 马上 rerun 把名称清空，否则会清掉用户下一次输入的内容；提示留到下一轮显示
+                st.session_state.clear_name = True
                 if mood == "不愉悦":
-                    st.info("宝宝一难过，小狗的世界天都黑了，我会一直陪着你的。❤️")
+                    st.session_state.flash = ("已保存新记录！", "宝宝一难过，小狗的世界天都黑了，我会一直陪着你的。❤️")
                 else:
-                    st.info("小狗好爱好爱你 ❤️")
+                    st.session_state.flash = ("已保存新记录！", "小狗好爱好爱你 ❤️")
+                st.rerun()
     # --- 情话 & 安慰 ---
     love_lines = [
         "宝贝，和你在一起的点滴我都想收藏。",
@@ -275,23 +425,27 @@ with left:
 
 with right:
     st.subheader("📚 记录总览")
-    df_view = st.session_state.df.copy()
 
     # 用户筛选
-    current_user = st.selectbox("查看哪个用户的数据", ["uuu", "ooo", "全部"], index=2)
-    if current_user != "全部":
-        df_view = df_view[df_view["用户"] == current_user]
-
+    current_user = st.selectbox("查看哪个用户的数据", USERS + ["全部"], index=len(USERS))
     # 筛选类型 + 关键字搜索
     f_type = st.selectbox("筛选类型", ["全部"] + BASE_TYPES)
+    kw = st.text_input("关键字搜索")
+    # 旧记录在归档分区里：搜索或勾选时才去读
+    show_archive = st.checkbox(f"包含 {HOT_DAYS} 天前的归档记录", value=False)
+
+    df_view = st.session_state.df
+    if show_archive or kw.strip():
+        df_view = with_archive(df_view, SPACE.root)
+    df_view = df_view.copy()
+    if current_user != "全部":
+        df_view = df_view[df_view["用户"] == current_user]
     if f_type != "全部":
         df_view = df_view[df_view["物品类型"] == f_type]
-
-    kw = st.text_input("关键字搜索")
     if kw.strip():
         df_view = df_view[df_view["名称"].str.contains(kw, na=False)]
 
-    # 多选删除：显示记录并允许勾选
+    # 多选删除：显示记录并允许勾选（归档记录也能删）
     st.write("选择要删除的记录（可多选）：")
     selected_ids = st.multiselect(
         "多选记录（显示 名称+时间）",
@@ -305,8 +459,14 @@ with right:
     if st.button("🗑 删除选中记录"):
         if selected_ids:
             ids = [x.split("|")[0] for x in selected_ids]
-            st.session_state.df = st.session_state.df[~st.session_state.df["记录ID"].isin(ids)]
+            take_snapshot(SPACE.root, reason=f"删除 {len(ids)} 条记录前")
+            hot = st.session_state.df
+            st.session_state.df = hot[~hot["记录ID"].isin(ids)]
             save_data(st.session_state.df)
+            # 同一记录ID可能两边都有（搬迁中断、旧会话写回），归档里的副本也要删，
+            # 否则热数据那条删掉后它会重新出现在搜索和推荐里
+            remove_archived(SPACE.root, ids)
+            get_name_index().remove(ids)
             st.success(f"已删除 {len(ids)} 条记录。")
             st.rerun()
         else:
@@ -338,7 +498,8 @@ if mood_now == "愉悦":
 
 elif mood_now == "不愉悦":
     # 推荐曾经标注为“愉悦”的记录
-    df_all = st.session_state.get("df", pd.DataFrame(columns=COLUMNS)).copy()
+    # 曾经愉悦的记录可能很久以前，这里才去读归档
+    df_all = with_archive(st.session_state.get("df", pd.DataFrame(columns=COLUMNS)), SPACE.root).copy()
     # 过滤出标注为愉悦的条目
     past_good = df_all[df_all["愉悦度"] == "愉悦"]
     if ctx_filter != "全部":
@@ -384,8 +545,8 @@ st.markdown("---")
 st.subheader("🔥 心情连击")
 df = st.session_state.df
 if not df.empty:
-    df["日期"] = pd.to_datetime(df["时间"]).dt.date
-    daily = df.groupby("日期")["愉悦度"].apply(lambda x: "愉悦" if "愉悦" in x.values else "非愉悦")
+    dates = pd.to_datetime(df["时间"]).dt.date
+    daily = df.groupby(dates)["愉悦度"].apply(lambda x: "愉悦" if "愉悦" in x.values else "非愉悦")
     streak = 0
     for mood in reversed(daily.values):
         if mood == "愉悦":
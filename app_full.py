@@ -7,6 +7,9 @@ import json
 import random
 import pytz
 
+from snapshots import take_snapshot
+from xlsx_cache import flush, has_frame, read_frame, write_frame
+
 # ---------------- CONFIG ----------------
 st.set_page_config(page_title="我们的专属小站", page_icon="💖", layout="wide")
 
@@ -39,8 +42,9 @@ def now_str():
     return datetime.now(tz).strftime("%Y-%m-%d %H:%M:%S")
 
 def load_data():
-    if Path(DATA_FILE).exists():
-        df = pd.read_excel(DATA_FILE, engine="openpyxl")
+    # 优先读 xlsx_cache 的缓存，表格手动改过时才走 openpyxl
+    if has_frame(DATA_FILE):
+        df = read_frame(DATA_FILE)
         for c in COLUMNS:
             if c not in df.columns:
                 df[c] = ""
@@ -52,7 +56,8 @@ def load_data():
         return pd.DataFrame(columns=COLUMNS)
 
 def save_data(df):
-    df.to_excel(DATA_FILE, index=False, engine="openpyxl")
+    # data.xlsx 稍后由后台线程写出
+    write_frame(df, DATA_FILE)
 
 def load_messages():
     if Path(MSG_FILE).exists():
@@ -184,6 +189,8 @@ with right:
         if row["备注"]: st.write(row["备注"])
         rid=row["记录ID"]
         if st.button("🗑 删除", key=f"del_{rid}"):
+            flush(DATA_FILE)
+            take_snapshot(".", reason="删除记录前")
             st.session_state.df = st.session_state.df[st.session_state.df["记录ID"]!=rid]
             save_data(st.session_state.df)
             st.experimental_rerun()
@@ -0,0 +1,264 @@
+# export_bundle.py
+# 按需生成导出包：记录 / 留言 / 心愿 / 奖池 / 照片 打进一个 zip。
+# 记录按块传入（归档一次一个月），全程分块写入磁盘上的临时文件，内存占用与包大小无关。
+# 网页下载要把整个包交给 streamlit 放在内存里，所以有大小上限，更大的用命令行导出。
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from pathlib import Path
+
+import pandas as pd
+
+from tiering import archive_bytes, iter_with_archive
+from xlsx_cache import has_frame, read_frame
+
+CHUNK_ROWS = 5000
+CHUNK_BYTES = 1 << 20
+FORMATS = ["csv", "xlsx", "parquet"]
+MAX_DOWNLOAD_BYTES = int(os.environ.get("EXPORT_MAX_MB", "100")) * 2**20
+
+
+# ---------------- 读取 / 筛选 ----------------
+def read_records(path):
+    path = Path(path)
+    if path.suffix == ".xlsx":
+        return read_frame(path) if has_frame(path) else pd.DataFrame()
+    if not path.exists():
+        return pd.DataFrame()
+    return pd.read_csv(path, encoding="utf-8-sig")
+
+
+def filter_by_time(df, start=None, end=None):
+    if df.empty or "时间" not in df.columns or (start is None and end is None):
+        return df
+    t = pd.to_datetime(df["时间"], errors="coerce")
+    mask = pd.Series(True, index=df.index)
+    if start is not None:
+        mask &= t >= pd.Timestamp(start)
+    if end is not None:
+        # end 按“含当天”处理
+        mask &= t < pd.Timestamp(end) + pd.Timedelta(days=1)
+    return df[mask]
+
+
+def filter_records(df, start=None, end=None, user=None):
+    df = filter_by_time(df, start, end)
+    if user and "用户" in df.columns:
+        df = df[df["用户"] == user]
+    return df
+
+
+# ---------------- 分块写入 ----------------
+def _chunks(records):
+    # 记录可以是一个 DataFrame，也可以是多个 DataFrame（比如逐月的归档分区）；
+    # 列以第一块有列的为准，空块跳过
+    if isinstance(records, pd.DataFrame):
+        records = [records]
+    columns = None
+    for df in records:
+        if columns is None:
+            if df.columns.empty:
+                continue
+            columns = df.columns
+        if len(df):
+            for i in range(0, len(df), CHUNK_ROWS):
+                yield df.iloc[i:i + CHUNK_ROWS].reindex(columns=columns)
+        elif not columns.empty:
+            yield df.reindex(columns=columns)
+
+
+def _write_csv(zf, arcname, chunks):
+    with zf.open(arcname, "w", force_zip64=True) as raw:
+        # utf-8-sig 只在第一块写 BOM，Excel 打开不会乱码
+        raw.write(b"\xef\xbb\xbf")
+        header = True
+        for part in chunks:
+            if header or len(part):
+                raw.write(part.to_csv(index=False, header=header).encode("utf-8"))
+                header = False
+
+
+def _write_via_tempfile(zf, arcname, writer):
+    # xlsx / parquet 需要可 seek 的文件，先落盘再由 zipfile 分块拷入
+    fd, tmp = tempfile.mkstemp(suffix=Path(arcname).suffix)
+    os.close(fd)
+    try:
+        writer(tmp)
+        zf.write(tmp, arcname)
+    finally:
+        Path(tmp).unlink(missing_ok=True)
+
+
+def _xlsx_writer(chunks):
+    def write(path):
+        from openpyxl import Workbook
+
+        # write_only 模式逐行落盘，不会把整张表留在内存里
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        header = True
+        for part in chunks:
+            if header:
+                ws.append([str(c) for c in part.columns])
+                header = False
+            for row in part.astype(object).where(part.notna(), None).itertuples(index=False):
+                ws.append(list(row))
+        wb.save(path)
+    return write
+
+
+def _parquet_writer(chunks):
+    def write(path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for part in chunks:
+                # 列里混有数字和字符串时 pyarrow 会报错，统一转成字符串
+                table = pa.Table.from_pandas(part.astype("string"), preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+    return write
+
+
+def _write_table(zf, stem, records, fmt):
+    if fmt == "csv":
+        _write_csv(zf, f"{stem}.csv", _chunks(records))
+    elif fmt == "xlsx":
+        _write_via_tempfile(zf, f"{stem}.xlsx", _xlsx_writer(_chunks(records)))
+    elif fmt == "parquet":
+        _write_via_tempfile(zf, f"{stem}.parquet", _parquet_writer(_chunks(records)))
+    else:
+        raise ValueError(f"不支持的导出格式：{fmt}")
+
+
+def _write_json(zf, arcname, obj):
+    with zf.open(arcname, "w") as raw:
+        raw.write(json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8"))
+
+
+def _write_file(zf, arcname, src):
+    with open(src, "rb") as fin, zf.open(arcname, "w", force_zip64=True) as fout:
+        shutil.copyfileobj(fin, fout, CHUNK_BYTES)
+
+
+# ---------------- 组装导出包 ----------------
+def write_bundle(dest, records, fmt="csv", msg_file=None, wish_file=None, lottery_file=None,
+                 upload_dir=None, start=None, end=None, user=None, include_photos=True):
+    # records：DataFrame 或 DataFrame 的迭代器，筛选也是逐块做
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的导出格式：{fmt}")
+    stats = {"records": 0, "messages": 0, "photos": 0}
+    photos = set()
+
+    def filtered(chunks):
+        for part in _chunks(chunks):
+            part = filter_records(part, start, end, user)
+            stats["records"] += len(part)
+            if "照片文件名" in part.columns:
+                photos.update(str(x) for x in part["照片文件名"].dropna() if str(x).strip())
+            yield part
+
+    def filtered_messages():
+        for part in pd.read_csv(msg_file, encoding="utf-8-sig", chunksize=CHUNK_ROWS):
+            part = filter_by_time(part, start, end)
+            stats["messages"] += len(part)
+            yield part
+
+    with zipfile.ZipFile(dest, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        _write_table(zf, "records", filtered(records), fmt)
+
+        if msg_file and Path(msg_file).exists():
+            _write_table(zf, "messages", filtered_messages(), fmt)
+
+        if wish_file and Path(wish_file).exists():
+            with open(wish_file, "r", encoding="utf-8") as f:
+                _write_json(zf, "wishes.json", json.load(f))
+
+        if lottery_file and Path(lottery_file).exists():
+            with open(lottery_file, "r", encoding="utf-8") as f:
+                _write_json(zf, "lottery.json", json.load(f))
+
+        # 只打包被筛选后记录引用到的照片
+        if include_photos and upload_dir:
+            for fn in sorted(photos):
+                src = Path(upload_dir) / Path(fn).name
+                if src.is_file():
+                    _write_file(zf, f"uploads/{src.name}", src)
+                    stats["photos"] += 1
+    return stats
+
+
+def build_bundle(records, **kwargs):
+    fd, path = tempfile.mkstemp(prefix="export_", suffix=".zip")
+    os.close(fd)
+    try:
+        stats = write_bundle(path, records, **kwargs)
+    except Exception:
+        Path(path).unlink(missing_ok=True)
+        raise
+    return path, stats
+
+
+def estimate_bundle_bytes(data_file=None, root=".", msg_file=None, upload_dir=None,
+                          start=None, end=None, include_photos=True):
+    # 只看文件大小的粗略上限（不读内容），网页上据此决定能不能直接下载；
+    # 归档是 gzip，按解压后约 4 倍算
+    total = 4 * archive_bytes(root, start, end)
+    for f in (data_file, msg_file):
+        if f and Path(f).exists():
+            total += Path(f).stat().st_size
+    if include_photos and upload_dir and Path(upload_dir).is_dir():
+        total += sum(p.stat().st_size for p in Path(upload_dir).iterdir() if p.is_file())
+    return total
+
+
+def bundle_bytes(records, max_bytes=MAX_DOWNLOAD_BYTES, **kwargs):
+    # 给 st.download_button 的延迟下载用：点击时才打包，读出后立刻删掉临时文件。
+    # streamlit 会把返回的整个包放在内存里，超过上限就不给，改用命令行导出
+    path, _ = build_bundle(records, **kwargs)
+    try:
+        size = Path(path).stat().st_size
+        if size > max_bytes:
+            raise ValueError(f"导出包 {size / 2**20:.0f} MB 超过网页下载上限，请用命令行导出")
+        return Path(path).read_bytes()
+    finally:
+        Path(path).unlink(missing_ok=True)
+
+
+# ---------------- 命令行 ----------------
+def main(argv=None):
+    p = argparse.ArgumentParser(description="导出记录 / 留言 / 心愿 / 奖池 / 照片 为一个 zip")
+    p.add_argument("--data", default="data.csv")
+    p.add_argument("--messages", default="messages.csv")
+    p.add_argument("--wishes", default="wishes.json")
+    p.add_argument("--lottery", default="lottery.json")
+    p.add_argument("--uploads", default="uploads")
+    p.add_argument("--format", choices=FORMATS, default="csv")
+    p.add_argument("--since", help="起始日期 YYYY-MM-DD")
+    p.add_argument("--until", help="结束日期 YYYY-MM-DD（含）")
+    p.add_argument("--user")
+    p.add_argument("--no-photos", action="store_true")
+    p.add_argument("--out", default="export.zip")
+    args = p.parse_args(argv)
+
+    stats = write_bundle(
+        args.out, iter_with_archive(read_records(args.data), Path(args.data).parent, args.since, args.until),
+        fmt=args.format,
+        msg_file=args.messages, wish_file=args.wishes, lottery_file=args.lottery,
+        upload_dir=args.uploads, start=args.since, end=args.until, user=args.user,
+        include_photos=not args.no_photos,
+    )
+    print(f"已导出 {args.out}：记录 {stats['records']} 条，留言 {stats['messages']} 条，照片 {stats['photos']} 张")
+
+
+if __name__ == "__main__":
+    main()
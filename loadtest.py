@@ -0,0 +1,309 @@
+# loadtest.py
+# 本地压测：用 Streamlit 自带的 AppTest 在同一进程里开 N 个会话并发驱动 app.py，
+# 统计每个场景的 rerun 延迟 p50/p95/p99（会话首次打开的冷启动单独统计）、峰值内存(RSS)和文件读写量。
+# 用法：
+#   python loadtest.py                       # 全部场景，8 个会话
+#   python loadtest.py -n 16 -i 20 --records 20000 add delete
+#   python loadtest.py --json result.json    # 结果存成 JSON 方便对比回归
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+from pathlib import Path
+from uuid import uuid4
+
+APP_DIR = Path(__file__).resolve().parent
+APP_FILE = APP_DIR / "app.py"
+
+# 与 app.py 的 COLUMNS 保持一致
+COLUMNS = [
+    "时间", "用户", "物品类型", "名称", "链接", "情境",
+    "主评级1", "次评级1", "主评级2", "次评级2",
+    "最终分", "最终推荐", "愉悦度", "备注", "照片文件名", "记录ID"
+]
+NAMES = ["喜茶多肉葡萄", "奈雪霸气橙子", "麦当劳薯条", "洗面奶", "耳机", "散步", "看电影", "火锅", "口红", "台灯"]
+SUBS = {"S": ["S+", "S", "S-"], "A": ["A+", "A", "A-"], "B": ["B+", "B", "B-"], "C": ["C+", "C", "C-"]}
+
+
+# ---------------- 合成数据 ----------------
+def make_data_dir(root, records=2000, messages=500, wishes=50, photos=100, seed=0):
+    rng = random.Random(seed)
+    root = Path(root)
+    (root / "uploads").mkdir(parents=True, exist_ok=True)
+    photo_names = []
+    for _ in range(photos):
+        fn = f"{uuid4().hex}.jpg"
+        (root / "uploads" / fn).write_bytes(os.urandom(rng.randint(20_000, 200_000)))
+        photo_names.append(fn)
+
+    # 记录时间截止到现在，大部分落在热数据里；更早的会在首次加载时被归档
+    t0 = datetime.now() - timedelta(minutes=records * 30)
+    with open(root / "data.csv", "w", encoding="utf-8-sig", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(COLUMNS)
+        for i in range(records):
+            main1 = rng.choice("SABC")
+            score = round(rng.uniform(0.5, 5.0), 3)
+            w.writerow([
+                (t0 + timedelta(minutes=i * 30)).strftime("%Y-%m-%d %H:%M:%S"),
+                rng.choice(["uuu", "ooo"]), rng.choice(["外卖", "生活用品", "化妆品", "数码", "小事", "其他"]),
+                f"{rng.choice(NAMES)}{rng.randint(0, records // 10)}", "", rng.choice(["在家", "通勤", "约会"]),
+                main1, rng.choice(SUBS[main1]), "", "",
+                score, "推荐" if score >= 4.2 else ("还行" if score >= 3.0 else "不推荐"),
+                rng.choice(["愉悦", "还行", "不愉悦"]), "", rng.choice(photo_names + [""] * photos) if photos else "",
+                uuid4().hex,
+            ])
+    with open(root / "messages.csv", "w", encoding="utf-8-sig", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["时间", "留言"])
+        for i in range(messages):
+            w.writerow([(t0 + timedelta(hours=i)).strftime("%Y-%m-%d %H:%M:%S"), f"第 {i} 条留言，爱你"])
+    with open(root / "wishes.json", "w", encoding="utf-8") as f:
+        json.dump([{"text": f"心愿 {i}", "done": False, "id": uuid4().hex} for i in range(wishes)], f, ensure_ascii=False)
+    with open(root / "lottery.json", "w", encoding="utf-8") as f:
+        json.dump({"再来一次": ["再试一次"], "获得奖励": ["抱抱~", "买杯奶茶"]}, f, ensure_ascii=False)
+
+
+# ---------------- AppTest 辅助 ----------------
+def _find(widgets, label):
+    for w in widgets:
+        if w.label == label:
+            return w
+    raise LookupError(f"找不到控件：{label}")
+
+
+def _timed(samples, fn):
+    t = time.perf_counter()
+    fn()
+    samples.append(time.perf_counter() - t)
+
+
+# ---------------- 场景 ----------------
+# 每个场景是一次“用户操作”，里面每个 .run() 都是一次 rerun，单独计时
+def scenario_add(at, rng, samples):
+    _timed(samples, lambda: _find(at.text_input, "名称/事件").input(f"压测物品{uuid4().hex[:6]}").run())
+    _timed(samples, lambda: _find(at.button, "保存").click().run())
+
+
+def scenario_second_rating(at, rng, samples):
+    _timed(samples, lambda: _find(at.text_input, "名称/事件").input(rng.choice(NAMES)).run())
+    radios = [r for r in at.radio if r.key == "op_target"]
+    if radios and len(radios[0].options) > 1:
+        # 选项是 0..n 的序号，0 表示“创建新条目”
+        _timed(samples, lambda: radios[0].set_value(1).run())
+    _timed(samples, lambda: _find(at.button, "保存").click().run())
+
+
+def scenario_delete(at, rng, samples):
+    ms = _find(at.multiselect, "多选记录（显示 名称+时间）")
+    if ms.options:
+        _timed(samples, lambda: ms.select(rng.choice(ms.options)).run())
+    _timed(samples, lambda: _find(at.button, "🗑 删除选中记录").click().run())
+
+
+def scenario_search_messages(at, rng, samples):
+    _timed(samples, lambda: _find(at.text_input, "搜索留言关键字").input(str(rng.randint(0, 99))).run())
+
+
+def scenario_toggle_wish(at, rng, samples):
+    toggles = [b for b in at.button if b.label == "切换"]
+    if toggles:
+        _timed(samples, lambda: rng.choice(toggles).click().run())
+
+
+def scenario_draw(at, rng, samples):
+    _timed(samples, lambda: _find(at.button, "🎯 抽一次").click().run())
+    _timed(samples, lambda: _find(at.button, "🎁 获得奖励").click().run())
+
+
+SCENARIOS = {
+    "add": scenario_add,
+    "second_rating": scenario_second_rating,
+    "delete": scenario_delete,
+    "search_messages": scenario_search_messages,
+    "toggle_wish": scenario_toggle_wish,
+    "draw": scenario_draw,
+}
+
+
+# ---------------- 统计 ----------------
+def percentile(values, p):
+    if not values:
+        return 0.0
+    # nearest-rank
+    s = sorted(values)
+    return s[max(0, math.ceil(p / 100 * len(s)) - 1)]
+
+
+def _proc_io():
+    # Linux 下读 /proc/self/io（系统调用层面的读写字节数）；其他平台返回 0
+    try:
+        with open("/proc/self/io") as f:
+            d = dict(line.split(": ") for line in f.read().splitlines())
+        return int(d["rchar"]), int(d["wchar"])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+def _peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 是 KB，macOS 是字节
+    return rss / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+# ---------------- 运行 ----------------
+# 下面改的是 streamlit.testing.v1.app_test 的内部实现，只在验证过的版本上跑；
+# 升级 streamlit 后先确认 AppTest._run 的逻辑没变，再放宽这个范围
+STREAMLIT_VERIFIED = ((1, 66), (1, 67))   # [下限, 上限)
+_PATCHED = ("Runtime", "patch_config_options", "ScriptCache")
+
+
+def _check_streamlit():
+    import streamlit
+    from streamlit.testing.v1 import app_test
+
+    version = tuple(int(x) for x in streamlit.__version__.split(".")[:2])
+    low, high = STREAMLIT_VERIFIED
+    if not low <= version < high:
+        raise RuntimeError(
+            f"loadtest 只在 streamlit {low[0]}.{low[1]}.x 上验证过，当前是 {streamlit.__version__}；"
+            f"并发会话依赖 AppTest 内部实现，请先核对 _share_app_test_globals 再修改 STREAMLIT_VERIFIED")
+    missing = [n for n in _PATCHED if n not in app_test.AppTest._run.__code__.co_names or not hasattr(app_test, n)]
+    if missing:
+        raise RuntimeError(f"AppTest 内部实现变了（找不到 {', '.join(missing)}），压测结果不可信")
+
+
+def _share_app_test_globals():
+    # AppTest 是按单会话设计的：每次 run 都会装一个假的 Runtime 单例、临时打开
+    # global.appTest 配置、新建 ScriptCache 重新编译脚本，跑完再全部撤掉。
+    # 多个会话并发时会互相撤掉对方的，这里改成所有会话共用一份，
+    # 和真实服务端一个进程一个 Runtime、一个脚本缓存一致。
+    _check_streamlit()
+    from contextlib import nullcontext
+
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test
+
+    class _Sticky(type):
+        def __setattr__(cls, key, value):
+            if key != "_instance":
+                return super().__setattr__(key, value)
+            if value is not None and Runtime._instance is None:
+                Runtime._instance = value
+
+    app_test.Runtime = _Sticky("SharedRuntime", (Runtime,), {})
+    config.set_option("global.appTest", True)
+    app_test.patch_config_options = lambda options: nullcontext()
+    script_cache = ScriptCache()
+    # 先编译一次：ScriptCache 的编译不在锁里，Python 3.11 并发 ast.parse 会报 SystemError
+    script_cache.get_bytecode(str(APP_FILE))
+    app_test.ScriptCache = lambda: script_cache
+
+
+def _session(scenario, iterations, seed, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    cold, samples = [], []
+    at = AppTest.from_file(str(APP_FILE), default_timeout=timeout)
+    # 会话的第一次 run（加载数据、建索引）单独统计，不混进场景的 rerun 延迟
+    _timed(cold, at.run)
+    for _ in range(iterations):
+        SCENARIOS[scenario](at, rng, samples)
+        if at.exception:
+            raise RuntimeError(f"{scenario}: {at.exception[0].message}")
+    return cold[0], samples
+
+
+def run_scenario(scenario, sessions, iterations, records, timeout=60):
+    # 每个场景在独立子进程里跑：峰值内存和 I/O 互不干扰
+    sys.path.insert(0, str(APP_DIR))
+    with tempfile.TemporaryDirectory(prefix="loadtest_") as tmp:
+        make_data_dir(tmp, records=records)
+        os.chdir(tmp)
+        import streamlit.testing.v1  # noqa: F401  先导入，不计入 I/O
+        _share_app_test_globals()
+
+        r0, w0 = _proc_io()
+        t0 = time.perf_counter()
+        errors = []
+        cold, samples = [], []
+        # 线程模拟会话：与 streamlit 服务端一个进程多线程跑会话的模型一致
+        with ThreadPoolExecutor(max_workers=sessions) as ex:
+            futures = [ex.submit(_session, scenario, iterations, i, timeout) for i in range(sessions)]
+            for fut in futures:
+                try:
+                    first, rest = fut.result()
+                    cold.append(first)
+                    samples.extend(rest)
+                except Exception as e:
+                    errors.append(str(e))
+        wall = time.perf_counter() - t0
+        r1, w1 = _proc_io()
+        os.chdir(APP_DIR)
+
+    ms = [x * 1000 for x in samples]
+    cold_ms = [x * 1000 for x in cold]
+    return {
+        "scenario": scenario,
+        "sessions": sessions,
+        "cold_p50_ms": round(percentile(cold_ms, 50), 1),
+        "cold_max_ms": round(max(cold_ms, default=0.0), 1),
+        "reruns": len(ms),
+        "p50_ms": round(percentile(ms, 50), 1),
+        "p95_ms": round(percentile(ms, 95), 1),
+        "p99_ms": round(percentile(ms, 99), 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "read_mb": round((r1 - r0) / 2**20, 2),
+        "write_mb": round((w1 - w0) / 2**20, 2),
+        "wall_s": round(wall, 2),
+        "errors": errors,
+    }
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="并发会话压测 app.py（基于 streamlit AppTest）")
+    p.add_argument("scenarios", nargs="*", help=f"可选：{', '.join(SCENARIOS)}（默认全部）")
+    p.add_argument("-n", "--sessions", type=int, default=8, help="并发会话数")
+    p.add_argument("-i", "--iterations", type=int, default=10, help="每个会话执行场景的次数")
+    p.add_argument("--records", type=int, default=2000, help="合成 data.csv 的记录条数")
+    p.add_argument("--timeout", type=float, default=60, help="单次 rerun 超时（秒）")
+    p.add_argument("--json", help="把结果写到 JSON 文件")
+    args = p.parse_args(argv)
+    unknown = [x for x in args.scenarios if x not in SCENARIOS]
+    if unknown:
+        p.error(f"未知场景：{', '.join(unknown)}")
+
+    results = []
+    # 冷启动是每个会话第一次打开页面；p50/p95/p99 只统计之后场景里的 rerun
+    print(f"{'场景':<16}{'会话':>5}{'冷启p50':>9}{'冷启max':>9}{'rerun':>7}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}"
+          f"{'RSS MB':>9}{'读 MB':>9}{'写 MB':>9}")
+    for name in args.scenarios or list(SCENARIOS):
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as ex:
+            r = ex.submit(run_scenario, name, args.sessions, args.iterations, args.records, args.timeout).result()
+        results.append(r)
+        print(f"{name:<16}{r['sessions']:>5}{r['cold_p50_ms']:>9}{r['cold_max_ms']:>9}{r['reruns']:>7}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}"
+              f"{r['peak_rss_mb']:>9}{r['read_mb']:>9}{r['write_mb']:>9}")
+        for e in r["errors"][:3]:
+            print(f"  ! {e}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"time": datetime.now().isoformat(timespec="seconds"), "results": results},
+                      f, ensure_ascii=False, indent=2)
+    return 1 if any(r["errors"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
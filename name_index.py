@@ -0,0 +1,139 @@
+# name_index.py
+# 名称的三元组(trigram)倒排索引，用于添加记录时找“差不多同名”的历史物品。
+# “喜茶多肉葡萄” 和 “喜茶 多肉葡萄” 归一化后是同一个名字。
+import heapq
+import threading
+import unicodedata
+from collections import defaultdict
+
+import pandas as pd
+
+
+def normalize_name(name):
+    # 全角转半角、统一小写、去掉空格和标点
+    s = unicodedata.normalize("NFKC", str(name or "")).lower()
+    return "".join(ch for ch in s if ch.isalnum())
+
+
+def trigrams(norm):
+    if not norm:
+        return set()
+    # 和 pg_trgm 一样前补两个空格、后补一个，短名字也有三元组
+    padded = f"  {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    # 粗略的内存估算（按 20 万条实测校准），SPACE_CACHE 用它把索引计入内存上限
+    RECORD_BYTES = 320
+    NAME_BYTES = 200
+    GRAM_BYTES = 60
+
+    def __init__(self):
+        self.grams = defaultdict(set)   # trigram -> 归一化名字
+        self.sizes = {}                 # 归一化名字 -> trigram 个数
+        # 按记录ID存展示用的字段：查相似时不用再碰 DataFrame（含归档有几十万行）
+        self.records = defaultdict(dict)   # 归一化名字 -> {记录ID: (时间, 名称, 最终分)}
+        self.where = {}                    # 记录ID -> 归一化名字
+        self.gram_refs = 0
+        # 同一空间的会话共用一个索引：保存时的增量更新和其他会话的查询互斥
+        self.lock = threading.RLock()
+
+    @classmethod
+    def from_df(cls, df):
+        return cls().update(df)
+
+    def approx_bytes(self):
+        return (len(self.where) * self.RECORD_BYTES + len(self.sizes) * self.NAME_BYTES
+                + self.gram_refs * self.GRAM_BYTES)
+
+    def update(self, df):
+        # 同一个记录ID再出现（比如热数据覆盖归档里的旧副本）以后来的为准。
+        # 批量加入时同名只归一化一次，也共用同一个名字字符串
+        norms = {}
+        times = df["时间"].fillna("").astype(str).tolist()
+        with self.lock:
+            for name, rid, score, t in zip(df["名称"].tolist(), df["记录ID"].tolist(), df["最终分"].tolist(), times):
+                hit = norms.get(name)
+                if hit is None:
+                    hit = norms[name] = (normalize_name(name), str(name))
+                self._put(hit[0], hit[1], rid, score, t)
+        return self
+
+    def add(self, name, rid, score=None, time=""):
+        with self.lock:
+            self._put(normalize_name(name), str(name), rid, score, "" if pd.isna(time) else str(time))
+
+    def remove(self, rids):
+        with self.lock:
+            for rid in rids:
+                self._remove(rid)
+
+    def _put(self, norm, name, rid, score, time):
+        if not norm:
+            return
+        if self.where.get(rid, norm) != norm:
+            self._remove(rid)
+        if norm not in self.sizes:
+            grams = trigrams(norm)
+            for g in grams:
+                self.grams[g].add(norm)
+            self.sizes[norm] = len(grams)
+            self.gram_refs += len(grams)
+        self.records[norm][rid] = (time, name, score)
+        self.where[rid] = norm
+
+    def _remove(self, rid):
+        norm = self.where.pop(rid, None)
+        if norm is None:
+            return
+        self.records[norm].pop(rid, None)
+        if not self.records[norm]:
+            # 这个名字没有记录了：连同三元组一起去掉，不再出现在建议里
+            del self.records[norm]
+            for g in trigrams(norm):
+                self.grams[g].discard(norm)
+                if not self.grams[g]:
+                    del self.grams[g]
+            self.gram_refs -= self.sizes.pop(norm)
+
+    def search(self, name, k=5, min_score=0.5):
+        norm = normalize_name(name)
+        q = trigrams(norm)
+        if not q:
+            return []
+        shared = defaultdict(int)
+        with self.lock:
+            for g in q:
+                for cand in self.grams.get(g, ()):
+                    shared[cand] += 1
+            scored = []
+            for cand, n in shared.items():
+                # 主排序：输入被覆盖的比例（边打字边匹配）；次排序：整体 Jaccard
+                cover = n / len(q)
+                if cover < min_score:
+                    continue
+                jaccard = n / (len(q) + self.sizes[cand] - n)
+                scored.append((cand == norm, cover, jaccard, cand))
+        # 短输入（比如“麦当劳”）可能命中上万个名字，只取前 k 个不整体排序
+        return [(cand, cover) for _, cover, _, cand in heapq.nlargest(k, scored)]
+
+
+def similar_items(index, name, k=5):
+    # 每个相似名字返回其最近一条记录（按时间）
+    out = []
+    for norm, score in index.search(name, k=k):
+        with index.lock:
+            recs = dict(index.records.get(norm, {}))
+        if not recs:
+            continue
+        rid, (t, display, final) = max(recs.items(), key=lambda kv: kv[1][0])
+        out.append({
+            "记录ID": rid,
+            "名称": display,
+            "最终分": final,
+            "时间": t,
+            "条数": len(recs),
+            "相似度": round(score, 2),
+        })
+    return out
@@ -0,0 +1,255 @@
+# snapshots.py
+# 数据目录的增量快照：文件切块后按 sha256 存一次，快照只记录清单。
+# 用法：
+#   python snapshots.py take [说明]
+#   python snapshots.py list
+#   python snapshots.py restore <快照ID>
+#   python snapshots.py prune [保留个数]    # 删掉旧快照并回收不再引用的块
+import hashlib
+import json
+import os
+import sys
+import threading
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+from uuid import uuid4
+
+SNAPSHOT_DIR = ".snapshots"
+TRACKED_FILES = ["data.csv", "data.xlsx", "messages.csv", "wishes.json", "lottery.json", "events.json"]
+TRACKED_DIRS = ["uploads", "archive"]
+# 固定大小切块：CSV 追加写入时只有最后一块会变，照片一般一整块
+CHUNK_SIZE = 1 << 20
+KEEP_SNAPSHOTS = 50
+# 快照ID按时间排序，同一秒内靠微秒区分
+ID_FORMAT = "%Y%m%d-%H%M%S-%f"
+
+_lock = threading.Lock()
+
+
+# ---------------- 对象存储 ----------------
+def _store(root):
+    return Path(root) / SNAPSHOT_DIR
+
+
+def _object_path(root, digest):
+    return _store(root) / "objects" / digest[:2] / digest
+
+
+def _atomic_write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid4().hex}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _put_chunk(root, block):
+    digest = hashlib.sha256(block).hexdigest()
+    path = _object_path(root, digest)
+    if not path.exists():
+        _atomic_write(path, zlib.compress(block, 6))
+    return digest
+
+
+def _get_chunk(root, digest):
+    with open(_object_path(root, digest), "rb") as f:
+        return zlib.decompress(f.read())
+
+
+def _write_chunks(root, path, digests):
+    # 一块一块写回，大照片也不会整份读进内存
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid4().hex}.tmp")
+    with open(tmp, "wb") as f:
+        for d in digests:
+            f.write(_get_chunk(root, d))
+    os.replace(tmp, path)
+
+
+# ---------------- 文件枚举 ----------------
+def tracked_paths(root="."):
+    root = Path(root)
+    out = []
+    for name in TRACKED_FILES:
+        if (root / name).is_file():
+            out.append(name)
+    for d in TRACKED_DIRS:
+        if (root / d).is_dir():
+            out.extend(sorted(p.relative_to(root).as_posix() for p in (root / d).rglob("*") if p.is_file()))
+    return out
+
+
+def _chunk_file(root, path):
+    chunks = []
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(CHUNK_SIZE)
+            if not block:
+                break
+            chunks.append(_put_chunk(root, block))
+    return chunks
+
+
+# ---------------- 快照 ----------------
+def _index_path(root):
+    return _store(root) / "index.jsonl"
+
+
+def _summary(m):
+    return {"id": m["id"], "时间": m["时间"], "说明": m.get("说明", ""),
+            "文件数": len(m["files"]), "大小": sum(x["size"] for x in m["files"].values())}
+
+
+def _write_index(root, snaps):
+    data = "".join(json.dumps(x, ensure_ascii=False) + "\n" for x in snaps)
+    _atomic_write(_index_path(root), data.encode("utf-8"))
+
+
+def _rebuild_index(root):
+    # 旧版本没有索引文件：扫一遍清单生成，之后只读索引
+    snaps = []
+    for p in sorted((_store(root) / "manifests").glob("*.json")):
+        with open(p, "r", encoding="utf-8") as f:
+            snaps.append(_summary(json.load(f)))
+    _write_index(root, snaps)
+    return snaps
+
+
+def list_snapshots(root="."):
+    # 只读索引（每个快照一行），不解析清单
+    if not (_store(root) / "manifests").exists():
+        return []
+    try:
+        with open(_index_path(root), "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return _rebuild_index(root)
+
+
+def load_manifest(snap_id, root="."):
+    path = _store(root) / "manifests" / f"{snap_id}.json"
+    if not path.exists():
+        raise FileNotFoundError(f"找不到快照：{snap_id}")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _next_id(last_id):
+    now = datetime.now()
+    if last_id:
+        # 时钟回拨或同一微秒内连拍时，保证新ID仍然排在最后
+        try:
+            floor = datetime.strptime(last_id, ID_FORMAT) + timedelta(microseconds=1)
+        except ValueError:
+            floor = datetime.strptime(last_id[:15], "%Y%m%d-%H%M%S") + timedelta(seconds=1)
+        now = max(now, floor)
+    return now.strftime(ID_FORMAT), now
+
+
+def take_snapshot(root=".", reason=""):
+    root = Path(root)
+    with _lock:
+        return _take_snapshot(root, reason)
+
+
+def _take_snapshot(root, reason):
+    prev = list_snapshots(root)
+    # 只读最近一份清单，用来跳过没变的文件
+    prev_files = load_manifest(prev[-1]["id"], root)["files"] if prev else {}
+
+    files = {}
+    for rel in tracked_paths(root):
+        st = (root / rel).stat()
+        old = prev_files.get(rel)
+        # 大小和 mtime 都没变就直接沿用上一份的块列表，不再读文件
+        if old and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns:
+            files[rel] = old
+        else:
+            files[rel] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "chunks": _chunk_file(root, root / rel)}
+
+    snap_id, now = _next_id(prev[-1]["id"] if prev else None)
+    manifest = {"id": snap_id, "时间": now.strftime("%Y-%m-%d %H:%M:%S"), "说明": reason, "files": files}
+    _atomic_write(_store(root) / "manifests" / f"{snap_id}.json",
+                  json.dumps(manifest, ensure_ascii=False, indent=1).encode("utf-8"))
+    _write_index(root, prev + [_summary(manifest)])
+    return snap_id
+
+
+def prune(root=".", keep=KEEP_SNAPSHOTS):
+    # 只保留最近 keep 个快照，再删掉没有任何清单引用的块。
+    # 别的进程正在拍快照时不要运行：它刚复用的块可能被当成垃圾删掉
+    root = Path(root)
+    with _lock:
+        snaps = list_snapshots(root)
+        if keep < 1 or len(snaps) <= keep:
+            return 0, 0
+        drop, kept = snaps[:-keep], snaps[-keep:]
+        _write_index(root, kept)
+        for x in drop:
+            (_store(root) / "manifests" / f"{x['id']}.json").unlink(missing_ok=True)
+
+        live = set()
+        for x in kept:
+            for info in load_manifest(x["id"], root)["files"].values():
+                live.update(info["chunks"])
+        freed = 0
+        for p in (_store(root) / "objects").glob("*/*"):
+            if p.name not in live and not p.name.startswith("."):
+                p.unlink()
+                freed += 1
+        return len(drop), freed
+
+
+def restore_snapshot(snap_id, root="."):
+    # 整个恢复过程持锁：同时拍的快照不会拍到恢复了一半的目录，prune 也不会删掉正在用的块
+    root = Path(root)
+    with _lock:
+        return _restore_snapshot(snap_id, root)
+
+
+def _restore_snapshot(snap_id, root):
+    target = load_manifest(snap_id, root)["files"]
+    # 恢复本身也是破坏性操作，先把当前状态存一份
+    before = _take_snapshot(root, reason=f"恢复 {snap_id} 前自动快照")
+    current = load_manifest(before, root)["files"]
+
+    changed = 0
+    for rel, info in target.items():
+        cur = current.get(rel)
+        if cur and cur["chunks"] == info["chunks"]:
+            continue
+        _write_chunks(root, root / rel, info["chunks"])
+        os.utime(root / rel, ns=(info["mtime_ns"], info["mtime_ns"]))
+        changed += 1
+    removed = 0
+    for rel in current:
+        if rel not in target:
+            (root / rel).unlink(missing_ok=True)
+            removed += 1
+    return changed, removed
+
+
+# ---------------- 命令行 ----------------
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    cmd = argv[0] if argv else "list"
+    if cmd == "take":
+        print(take_snapshot(".", reason=" ".join(argv[1:]) or "手动快照"))
+    elif cmd == "list":
+        for s in list_snapshots("."):
+            print(f"{s['id']}  {s['时间']}  {s['文件数']} 个文件  {s['大小']} 字节  {s['说明']}")
+    elif cmd == "restore" and len(argv) > 1:
+        changed, removed = restore_snapshot(argv[1], ".")
+        print(f"已恢复 {argv[1]}：写回 {changed} 个文件，删除 {removed} 个文件")
+    elif cmd == "prune":
+        snaps, objects = prune(".", int(argv[1]) if len(argv) > 1 else KEEP_SNAPSHOTS)
+        print(f"已删除 {snaps} 个旧快照，回收 {objects} 个数据块")
+    else:
+        print("用法：python snapshots.py take [说明] | list | restore <快照ID> | prune [保留个数]")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+# spaces.py
+# 一个进程托管多个“空间”（每对情侣一个），通过 URL 参数 ?space=名字 选择。
+# 每个空间有自己的数据目录和用户列表：spaces/<名字>/space.json。
+# 已加载的记录放在进程级 LRU 里，按内存上限和空闲时间淘汰，
+# 所以内存只随“正在用的空间”增长，而不是随空间总数增长。
+# 用法：
+#   python spaces.py create 名字 用户1 用户2
+#   python spaces.py list
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+SPACES_ROOT = Path(os.environ.get("SPACES_ROOT", "spaces"))
+DEFAULT_USERS = ("uuu", "ooo")
+NAME_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+# ---------------- 空间定义 ----------------
+@dataclass(frozen=True)
+class Space:
+    name: str
+    root: Path
+    users: tuple
+
+    @property
+    def data_file(self):
+        return str(self.root / "data.csv")
+
+    @property
+    def msg_file(self):
+        return str(self.root / "messages.csv")
+
+    @property
+    def lottery_file(self):
+        return str(self.root / "lottery.json")
+
+    @property
+    def wish_file(self):
+        return str(self.root / "wishes.json")
+
+    @property
+    def upload_dir(self):
+        return self.root / "uploads"
+
+
+def get_space(name=""):
+    # 不带参数时是原来的单空间：当前目录 + 默认用户，老部署不用迁移
+    if not name:
+        return Space("", Path("."), DEFAULT_USERS)
+    if not NAME_RE.match(name):
+        raise ValueError(f"空间名不合法：{name}")
+    root = SPACES_ROOT / name
+    cfg = root / "space.json"
+    if not cfg.exists():
+        raise FileNotFoundError(f"空间不存在：{name}")
+    with open(cfg, "r", encoding="utf-8") as f:
+        users = json.load(f).get("users") or list(DEFAULT_USERS)
+    return Space(name, root, tuple(users))
+
+
+def create_space(name, users):
+    if not NAME_RE.match(name):
+        raise ValueError(f"空间名不合法：{name}")
+    root = SPACES_ROOT / name
+    (root / "uploads").mkdir(parents=True, exist_ok=True)
+    with open(root / "space.json", "w", encoding="utf-8") as f:
+        json.dump({"users": list(users) or list(DEFAULT_USERS)}, f, ensure_ascii=False, indent=2)
+    return get_space(name)
+
+
+def list_spaces():
+    if not SPACES_ROOT.exists():
+        return []
+    return sorted(p.parent.name for p in SPACES_ROOT.glob("*/space.json"))
+
+
+# ---------------- 已加载空间的 LRU ----------------
+class SpaceCache:
+    def __init__(self, max_bytes, idle_seconds):
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        # 空间名 -> {"df", "bytes", "used", "version", "derived", "build_lock"}
+        # derived 是由记录算出来、同一空间所有会话共用的数据（比如名称索引），一起计内存、一起淘汰
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # 正在读盘的空间 -> {"lock", "waiters", "dropped"}；读完就删，不会随空间数增长
+        self.loading = {}
+        # 全局递增的版本号：淘汰后重新加载也会拿到新版本，会话据此判断要不要刷新
+        self.versions = itertools.count(1)
+
+    @staticmethod
+    def _entry_bytes(e):
+        # 派生数据需要提供 approx_bytes()
+        return e["bytes"] + sum(x.approx_bytes() for x in e["derived"].values())
+
+    def _evict(self, keep):
+        now = time.monotonic()
+        for name in [n for n, e in self.entries.items() if n != keep and now - e["used"] > self.idle_seconds]:
+            del self.entries[name]
+        # 从最久没用的开始淘汰，直到回到内存上限以内；刚用到的那个不淘汰
+        while self.total_bytes() > self.max_bytes and len(self.entries) > 1:
+            name = next(iter(self.entries))
+            if name == keep:
+                self.entries.move_to_end(name)
+                continue
+            del self.entries[name]
+
+    def total_bytes(self):
+        return sum(self._entry_bytes(e) for e in self.entries.values())
+
+    def _touch(self, name, e):
+        e["used"] = time.monotonic()
+        self.entries.move_to_end(name)
+        self._evict(keep=name)
+        return e["df"], e["version"]
+
+    def _new_entry(self, df, old=None):
+        # put 换数据时保留派生数据：保存的会话负责增量更新它们
+        return {"df": df, "bytes": int(df.memory_usage(deep=True).sum()),
+                "used": time.monotonic(), "version": next(self.versions),
+                "derived": old["derived"] if old else {},
+                "build_lock": old["build_lock"] if old else threading.Lock()}
+
+    def get(self, name, loader):
+        with self.lock:
+            e = self.entries.get(name)
+            if e is not None:
+                return self._touch(name, e)
+            load = self.loading.setdefault(name, {"lock": threading.Lock(), "waiters": 0, "dropped": False})
+            load["waiters"] += 1
+        try:
+            # 同一空间只读一次盘；读盘时不占全局锁，其他空间的会话不用等
+            with load["lock"]:
+                with self.lock:
+                    e = self.entries.get(name)
+                    if e is not None:
+                        return self._touch(name, e)
+                    load["dropped"] = False
+                df = loader()
+                with self.lock:
+                    e = self.entries.get(name)
+                    if e is not None:
+                        # 加载期间别的会话 put 了更新的数据
+                        return self._touch(name, e)
+                    e = self._new_entry(df)
+                    if load["dropped"]:
+                        # 加载期间被 drop（比如恢复了快照），读到的可能是旧数据，不放进缓存
+                        return e["df"], e["version"]
+                    self.entries[name] = e
+                    return self._touch(name, e)
+        finally:
+            with self.lock:
+                load["waiters"] -= 1
+                if not load["waiters"]:
+                    self.loading.pop(name, None)
+
+    def derived(self, name, key, build, loader):
+        # 取同一空间共用的派生数据，没有就用当前记录 build(df) 一次
+        self.get(name, loader)
+        with self.lock:
+            e = self.entries.get(name)
+            if e is None:
+                # 刚加载就被淘汰/drop 了：这次现算，不缓存
+                return build(self.get(name, loader)[0])
+            lock = e["build_lock"]
+        with lock:
+            with self.lock:
+                e = self.entries.get(name)
+                if e is None:
+                    return build(self.get(name, loader)[0])
+                obj = e["derived"].get(key)
+                if obj is not None:
+                    self._touch(name, e)
+                    return obj
+                df, derived = e["df"], e["derived"]
+            obj = build(df)
+            with self.lock:
+                e = self.entries.get(name)
+                # 构建期间空间被淘汰或 drop 了就不放回去
+                if e is not None and e["derived"] is derived:
+                    derived[key] = obj
+                    self._touch(name, e)
+            return obj
+
+    def put(self, name, df):
+        with self.lock:
+            e = self.entries[name] = self._new_entry(df, self.entries.get(name))
+            return self._touch(name, e)[1]
+
+    def drop(self, name):
+        with self.lock:
+            self.entries.pop(name, None)
+            if name in self.loading:
+                self.loading[name]["dropped"] = True
+
+
+SPACE_CACHE = SpaceCache(
+    max_bytes=int(os.environ.get("SPACE_CACHE_MB", "256")) * 2**20,
+    idle_seconds=int(os.environ.get("SPACE_IDLE_SECONDS", "1800")),
+)
+
+
+# ---------------- 命令行 ----------------
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    cmd = argv[0] if argv else "list"
+    if cmd == "create" and len(argv) > 1:
+        space = create_space(argv[1], argv[2:])
+        print(f"已创建空间 {space.name}：{space.root}（用户：{'、'.join(space.users)}）访问 ?space={space.name}")
+    elif cmd == "list":
+        for name in list_spaces():
+            print(f"{name}  {'、'.join(get_space(name).users)}")
+    else:
+        print("用法：python spaces.py create 名字 [用户...] | list")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
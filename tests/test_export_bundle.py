@@ -0,0 +1,113 @@
+import io
+import tempfile
+import zipfile
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import export_bundle
+from export_bundle import bundle_bytes, main, write_bundle
+from tiering import retier
+
+
+def _records():
+    return pd.DataFrame({
+        "时间": ["2024-01-01 10:00:00", "2024-01-02 23:59:59", "2024-01-03 00:00:00", "2024-01-02 08:00:00"],
+        "用户": ["uuu", "ooo", "uuu", "uuu"],
+        "名称": ["苹果", "香蕉", "橙子", "葡萄"],
+        "最终分": [4.7, 3.8, 2.5, 5.0],
+        "照片文件名": ["a.jpg", "b.jpg", "c.jpg", None],
+        "记录ID": ["r1", "r2", "r3", "r4"],
+    })
+
+
+def _uploads(root):
+    d = root / "uploads"
+    d.mkdir()
+    for fn in ["a.jpg", "b.jpg", "c.jpg", "unused.jpg"]:
+        (d / fn).write_bytes(fn.encode())
+    return d
+
+
+def _read_zip(path, name, fmt="csv"):
+    with zipfile.ZipFile(path) as zf:
+        data = zf.read(name)
+        names = zf.namelist()
+    if fmt == "csv":
+        return data, names, pd.read_csv(io.BytesIO(data), encoding="utf-8-sig")
+    if fmt == "xlsx":
+        return data, names, pd.read_excel(io.BytesIO(data), engine="openpyxl")
+    return data, names, pd.read_parquet(io.BytesIO(data))
+
+
+def test_date_range_end_is_inclusive_and_user_filter(tmp_path):
+    out = tmp_path / "out.zip"
+    stats = write_bundle(out, _records(), start="2024-01-01", end="2024-01-02", user="uuu",
+                         upload_dir=_uploads(tmp_path))
+    _, names, df = _read_zip(out, "records.csv")
+    assert df["名称"].tolist() == ["苹果", "葡萄"]
+    assert stats == {"records": 2, "messages": 0, "photos": 1}
+    # 只打包被筛选后记录引用到的照片
+    assert sorted(n for n in names if n.startswith("uploads/")) == ["uploads/a.jpg"]
+
+
+def test_chunked_csv_has_one_bom_and_one_header(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_bundle, "CHUNK_ROWS", 2)
+    df = _records()
+    # 逐块传入（像逐月的归档分区），中间夹一个空块
+    out = tmp_path / "out.zip"
+    stats = write_bundle(out, iter([df.iloc[:3], df.iloc[0:0], df.iloc[3:]]), include_photos=False)
+    raw, _, got = _read_zip(out, "records.csv")
+    assert raw.startswith(b"\xef\xbb\xbf") and raw.count(b"\xef\xbb\xbf") == 1
+    assert raw.decode("utf-8-sig").count("时间,用户") == 1
+    assert got["记录ID"].tolist() == ["r1", "r2", "r3", "r4"]
+    assert stats["records"] == 4
+
+
+def test_messages_are_filtered_by_time(tmp_path):
+    msgs = tmp_path / "messages.csv"
+    pd.DataFrame({"时间": ["2023-12-31 10:00:00", "2024-01-01 09:00:00"], "留言": ["旧", "新"]}) \
+        .to_csv(msgs, index=False, encoding="utf-8-sig")
+    out = tmp_path / "out.zip"
+    stats = write_bundle(out, _records(), msg_file=msgs, start="2024-01-01")
+    assert _read_zip(out, "messages.csv")[2]["留言"].tolist() == ["新"]
+    assert stats["messages"] == 1
+
+
+@pytest.mark.parametrize("fmt", ["xlsx", "parquet"])
+def test_xlsx_and_parquet_outputs(tmp_path, monkeypatch, fmt):
+    monkeypatch.setattr(export_bundle, "CHUNK_ROWS", 3)
+    out = tmp_path / "out.zip"
+    write_bundle(out, _records(), fmt=fmt, include_photos=False)
+    _, _, df = _read_zip(out, f"records.{fmt}", fmt)
+    assert df["名称"].tolist() == ["苹果", "香蕉", "橙子", "葡萄"]
+    assert df["记录ID"].tolist() == ["r1", "r2", "r3", "r4"]
+    assert len(df.columns) == 6
+
+
+def test_bundle_bytes_leaves_no_tempfile(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    data = bundle_bytes(_records(), fmt="csv")
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.namelist() == ["records.csv"]
+    assert list(Path(tmp_path).iterdir()) == []
+
+
+def test_bundle_bytes_refuses_oversized_bundle(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    with pytest.raises(ValueError, match="命令行"):
+        bundle_bytes(_records(), max_bytes=10, upload_dir=_uploads(tmp_path))
+    assert [p.name for p in tmp_path.iterdir()] == ["uploads"]
+
+
+def test_cli_streams_archive_partitions(tmp_path, capsys):
+    df = _records().assign(时间=["2020-01-05 10:00:00", "2020-02-05 10:00:00",
+                                pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"), "2020-02-06 10:00:00"])
+    df.to_csv(tmp_path / "data.csv", index=False, encoding="utf-8-sig")
+    retier(tmp_path, hot_days=30)
+    out = tmp_path / "out.zip"
+    main(["--data", str(tmp_path / "data.csv"), "--uploads", str(tmp_path / "none"),
+          "--messages", "", "--wishes", "", "--lottery", "", "--out", str(out)])
+    assert sorted(_read_zip(out, "records.csv")[2]["记录ID"]) == ["r1", "r2", "r3", "r4"]
+    assert "记录 4 条" in capsys.readouterr().out
@@ -0,0 +1,57 @@
+from uuid import uuid4
+
+import pandas as pd
+
+from name_index import NameIndex, normalize_name, similar_items
+
+
+def _row(name, t):
+    return {"时间": t, "名称": name, "最终分": 4.0, "记录ID": uuid4().hex}
+
+
+def _frame(names):
+    return pd.DataFrame([_row(n, f"2024-01-0{i + 1} 12:00:00") for i, n in enumerate(names)])
+
+
+def test_normalize_ignores_spaces_and_width():
+    assert normalize_name("喜茶 多肉葡萄") == normalize_name("喜茶多肉葡萄")
+    assert normalize_name("ＡｉｒＰｏｄｓ") == "airpods"
+
+
+def test_delete_then_add_resolves_to_same_record():
+    # 与 app.py 一致：删除后重建索引，新增时 concat(ignore_index=True) 重新编号
+    df = _frame(["甲苹果", "乙香蕉", "丙橙子", "丁葡萄"])
+    orange_id = df.loc[df["名称"] == "丙橙子", "记录ID"].iloc[0]
+
+    df = df[df["名称"] != "乙香蕉"]
+    idx = NameIndex.from_df(df)
+
+    new = _row("戊西瓜", "2024-01-09 12:00:00")
+    df = pd.concat([df, pd.DataFrame([new])], ignore_index=True)
+    idx.add(new["名称"], new["记录ID"])
+
+    hits = similar_items(idx, "丙橙子")
+    assert hits[0]["记录ID"] == orange_id
+    assert hits[0]["名称"] == "丙橙子"
+    assert df.loc[df["记录ID"] == hits[0]["记录ID"], "名称"].iloc[0] == "丙橙子"
+
+
+def test_remove_drops_name_and_keeps_others():
+    df = _frame(["甲苹果", "乙香蕉"])
+    idx = NameIndex.from_df(df)
+    idx.remove(df.loc[df["名称"] == "乙香蕉", "记录ID"])
+    assert similar_items(idx, "乙香蕉") == []
+    assert similar_items(idx, "甲苹果")[0]["名称"] == "甲苹果"
+
+
+def test_latest_record_and_count_without_dataframe():
+    df = _frame(["丙橙子", "丙 橙子", "甲苹果"])
+    idx = NameIndex.from_df(df)
+    hit = similar_items(idx, "丙橙子")[0]
+    assert (hit["名称"], hit["时间"], hit["条数"]) == ("丙 橙子", "2024-01-02 12:00:00", 2)
+
+    # 二次评级：同一记录ID更新分数和时间，条数不变
+    first = df["记录ID"].iloc[0]
+    idx.add("丙橙子", first, 5.0, "2024-02-01 09:00:00")
+    hit = similar_items(idx, "丙橙子")[0]
+    assert (hit["记录ID"], hit["最终分"], hit["条数"]) == (first, 5.0, 2)
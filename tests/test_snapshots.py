@@ -0,0 +1,69 @@
+import threading
+
+import snapshots
+from snapshots import _index_path, list_snapshots, prune, restore_snapshot, take_snapshot
+
+
+def test_ids_are_monotonic_within_a_second(tmp_path):
+    (tmp_path / "data.csv").write_text("a\n1\n", encoding="utf-8")
+    ids = [take_snapshot(tmp_path, reason=str(i)) for i in range(5)]
+    assert ids == sorted(ids) and len(set(ids)) == 5
+    assert [s["id"] for s in list_snapshots(tmp_path)] == ids
+
+
+def test_list_rebuilds_missing_index(tmp_path):
+    (tmp_path / "data.csv").write_text("a\n1\n", encoding="utf-8")
+    ids = [take_snapshot(tmp_path), take_snapshot(tmp_path)]
+    _index_path(tmp_path).unlink()
+    assert [s["id"] for s in list_snapshots(tmp_path)] == ids
+    assert _index_path(tmp_path).exists()
+
+
+def test_prune_keeps_latest_and_collects_objects(tmp_path):
+    data = tmp_path / "data.csv"
+    for i in range(4):
+        data.write_text(f"a\n{i}\n", encoding="utf-8")
+        take_snapshot(tmp_path)
+    objects = lambda: sorted(p.name for p in (tmp_path / ".snapshots" / "objects").glob("*/*"))
+    assert len(objects()) == 4
+
+    assert prune(tmp_path, keep=2) == (2, 2)
+    snaps = list_snapshots(tmp_path)
+    assert len(snaps) == 2 and len(objects()) == 2
+
+    data.write_text("changed\n", encoding="utf-8")
+    restore_snapshot(snaps[0]["id"], tmp_path)
+    assert data.read_text(encoding="utf-8") == "a\n2\n"
+
+
+def test_take_waits_for_a_running_restore(tmp_path, monkeypatch):
+    a, b = tmp_path / "data.csv", tmp_path / "messages.csv"
+    a.write_text("a\n1\n", encoding="utf-8")
+    b.write_text("b\n1\n", encoding="utf-8")
+    old = take_snapshot(tmp_path)
+    a.write_text("a\n22\n", encoding="utf-8")
+    b.write_text("b\n22\n", encoding="utf-8")
+
+    started, release = threading.Event(), threading.Event()
+    write_chunks = snapshots._write_chunks
+
+    def slow_write(root, dest, chunks):
+        write_chunks(root, dest, chunks)
+        started.set()
+        release.wait(5)
+
+    monkeypatch.setattr(snapshots, "_write_chunks", slow_write)
+    restorer = threading.Thread(target=restore_snapshot, args=(old, tmp_path))
+    restorer.start()
+    assert started.wait(5)
+    taken = []
+    taker = threading.Thread(target=lambda: taken.append(take_snapshot(tmp_path)))
+    taker.start()
+    taker.join(0.2)
+    assert taker.is_alive()  # 恢复到一半时不能拍快照
+
+    release.set()
+    restorer.join(5)
+    taker.join(5)
+    chunks = lambda sid: {k: v["chunks"] for k, v in snapshots.load_manifest(sid, tmp_path)["files"].items()}
+    assert chunks(taken[0]) == chunks(old)
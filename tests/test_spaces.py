@@ -0,0 +1,90 @@
+import pandas as pd
+
+from spaces import SpaceCache
+
+
+def _df(n=3):
+    return pd.DataFrame({"名称": [f"x{i}" for i in range(n)]})
+
+
+def test_get_while_another_space_is_loading():
+    cache = SpaceCache(max_bytes=10**9, idle_seconds=3600)
+
+    def load_a():
+        # 读 A 的过程中另一个会话访问 B，会触发淘汰检查
+        cache.get("B", _df)
+        return _df()
+
+    df, _ = cache.get("A", load_a)
+    assert len(df) == 3
+    assert set(cache.entries) == {"A", "B"}
+    assert all("used" in e for e in cache.entries.values())
+
+
+def test_drop_during_load_is_not_cached():
+    cache = SpaceCache(max_bytes=10**9, idle_seconds=3600)
+
+    def load_stale():
+        cache.drop("A")   # 比如此时恢复了快照
+        return _df(1)
+
+    df, v1 = cache.get("A", load_stale)
+    assert len(df) == 1
+    assert "A" not in cache.entries
+    df, v2 = cache.get("A", lambda: _df(5))
+    assert len(df) == 5 and v2 > v1
+
+
+def test_evicts_least_recently_used_over_budget():
+    one = int(_df().memory_usage(deep=True).sum())
+    cache = SpaceCache(max_bytes=one * 2, idle_seconds=3600)
+    for name in ["A", "B", "C"]:
+        cache.get(name, _df)
+    assert list(cache.entries) == ["B", "C"]
+    cache.get("B", _df)
+    cache.put("D", _df())
+    assert list(cache.entries) == ["B", "D"]
+
+
+class _Derived:
+    def __init__(self, df, size=0):
+        self.rows = len(df)
+        self.size = size
+
+    def approx_bytes(self):
+        return self.size
+
+
+def test_loading_state_is_released_after_load():
+    cache = SpaceCache(max_bytes=10**9, idle_seconds=3600)
+    for name in ["A", "B", "C"]:
+        cache.get(name, _df)
+        cache.drop(name)
+    assert cache.loading == {}
+
+
+def test_derived_is_shared_kept_on_put_and_dropped_with_entry():
+    cache = SpaceCache(max_bytes=10**9, idle_seconds=3600)
+    builds = []
+
+    def build(df):
+        builds.append(len(df))
+        return _Derived(df)
+
+    first = cache.derived("A", "idx", build, _df)
+    assert cache.derived("A", "idx", build, _df) is first
+    cache.put("A", _df(5))   # 保存：派生数据由保存方增量更新，不重建
+    assert cache.derived("A", "idx", build, _df) is first
+    cache.drop("A")
+    assert cache.derived("A", "idx", build, _df) is not first
+    assert builds == [3, 3]
+
+
+def test_derived_bytes_count_towards_budget():
+    one = int(_df().memory_usage(deep=True).sum())
+    cache = SpaceCache(max_bytes=one * 4, idle_seconds=3600)
+    cache.get("A", _df)
+    cache.get("B", _df)
+    cache.derived("B", "idx", lambda df: _Derived(df, size=one * 2), _df)
+    cache.get("C", _df)
+    assert list(cache.entries) == ["B", "C"]
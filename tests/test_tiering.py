@@ -0,0 +1,55 @@
+import pandas as pd
+
+import tiering
+from tiering import PARTITIONS, PartitionCache, iter_archive, list_partitions, load_archive, remove_archived, retier
+
+
+def _write(root, rows):
+    pd.DataFrame(rows, columns=["时间", "名称", "记录ID"]).to_csv(root / "data.csv", index=False, encoding="utf-8-sig")
+
+
+def test_remove_archived_rewrites_and_drops_partitions(tmp_path):
+    _write(tmp_path, [
+        ("2020-01-05 10:00:00", "苹果", "a"),
+        ("2020-01-06 10:00:00", "香蕉", "b"),
+        ("2020-02-01 10:00:00", "橙子", "c"),
+        (pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"), "西瓜", "d"),
+    ])
+    assert retier(tmp_path, hot_days=30) == 3
+    assert list_partitions(tmp_path) == ["2020-01", "2020-02"]
+
+    removed = remove_archived(tmp_path, ["a", "c", "d"])
+    assert sorted(removed["记录ID"]) == ["a", "c"]
+    assert list_partitions(tmp_path) == ["2020-01"]
+    assert load_archive(tmp_path)["记录ID"].tolist() == ["b"]
+    assert remove_archived(tmp_path, []).empty
+
+
+def _archive(root, months, rows=50):
+    _write(root, [(f"2020-{m:02d}-01 10:00:00", f"物品{m}-{i}", f"{root.name}-{m}-{i}")
+                  for m in months for i in range(rows)])
+    retier(root, hot_days=30)
+
+
+def test_partition_cache_survives_repeated_full_scans(tmp_path, monkeypatch):
+    _archive(tmp_path, range(1, 7))
+    one = PARTITIONS.read(tmp_path, "2020-01").memory_usage(deep=True).sum()
+    cache = PartitionCache(max_bytes=int(one * 3.5))
+    monkeypatch.setattr(tiering, "PARTITIONS", cache)
+
+    for _ in range(3):
+        assert sum(len(p) for p in iter_archive(tmp_path)) == 300
+    # 放得下 3 个分区：后两次扫描都命中这 3 个，而不是被顺序扫描挤掉
+    assert (cache.hits, cache.misses) == (6, 12)
+    assert cache.bytes <= cache.max_bytes
+
+
+def test_partition_cache_is_keyed_per_space(tmp_path):
+    a, b = tmp_path / "a", tmp_path / "b"
+    a.mkdir()
+    b.mkdir()
+    _archive(a, [1])
+    _archive(b, [1])
+    cache = PartitionCache(max_bytes=2**30)
+    assert cache.read(a, "2020-01")["记录ID"].iloc[0].startswith("a-")
+    assert cache.read(b, "2020-01")["记录ID"].iloc[0].startswith("b-")
@@ -0,0 +1,67 @@
+import threading
+
+import pandas as pd
+
+import xlsx_cache
+from xlsx_cache import flush, read_frame, write_frame
+
+
+def test_reads_and_flushes_race_with_writes(tmp_path, monkeypatch):
+    monkeypatch.setattr(xlsx_cache, "FLUSH_DELAY", 0.01)
+    xlsx = tmp_path / "data.xlsx"
+    pd.DataFrame({"名称": ["起始"]}).to_excel(xlsx, index=False, engine="openpyxl")
+    errors = []
+
+    def writer():
+        for i in range(20):
+            write_frame(pd.DataFrame({"名称": [f"第{j}条" for j in range(i + 1)]}), xlsx)
+
+    def reader():
+        try:
+            for _ in range(20):
+                assert len(read_frame(xlsx)) >= 1
+        except Exception as e:   # 线程里的异常带回主线程
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    flush(xlsx)
+    assert not errors
+    assert len(read_frame(xlsx)) == 20
+    assert len(pd.read_excel(xlsx, engine="openpyxl")) == 20
+    assert not list(tmp_path.glob("*.conflict.pkl"))
+
+
+def test_write_does_not_wait_for_slow_flush(tmp_path, monkeypatch):
+    monkeypatch.setattr(xlsx_cache, "FLUSH_DELAY", 60)
+    xlsx = tmp_path / "data.xlsx"
+    pd.DataFrame({"名称": ["起始"]}).to_excel(xlsx, index=False, engine="openpyxl")
+    write_frame(pd.DataFrame({"名称": ["一"]}), xlsx)
+
+    started, release = threading.Event(), threading.Event()
+    to_excel = pd.DataFrame.to_excel
+
+    def slow_to_excel(self, *args, **kwargs):
+        started.set()
+        release.wait(5)   # 模拟 openpyxl 写大表
+        return to_excel(self, *args, **kwargs)
+
+    monkeypatch.setattr(pd.DataFrame, "to_excel", slow_to_excel)
+    result = []
+    t = threading.Thread(target=lambda: result.append(flush(xlsx)))
+    t.start()
+    assert started.wait(5)
+    write_frame(pd.DataFrame({"名称": ["一", "二"]}), xlsx)   # 持锁写的话会卡到 release
+    assert len(read_frame(xlsx)) == 2
+    release.set()
+    t.join()
+
+    # 写表期间缓存变了：这次 flush 作废，不会把旧数据写进 xlsx
+    assert result == [False]
+    assert pd.read_excel(xlsx, engine="openpyxl")["名称"].tolist() == ["起始"]
+    assert not list(tmp_path.glob("*.tmp.xlsx"))
+    assert flush(xlsx) is True
+    assert pd.read_excel(xlsx, engine="openpyxl")["名称"].tolist() == ["一", "二"]
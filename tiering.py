@@ -0,0 +1,219 @@
+# tiering.py
+# 冷热分层：超过 HOT_DAYS 天的记录按月搬进 archive/records-YYYY-MM.csv.gz，
+# data.csv 里只留最近的热数据，启动时 load_data 读得快。
+# 归档分区只在需要时（日期范围、搜索、心情推荐等）按月懒加载。
+# 用法：
+#   python tiering.py                  # 当前目录
+#   python tiering.py --days 30
+#   python tiering.py --all-spaces     # 当前目录 + spaces/ 下所有空间
+import argparse
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from pathlib import Path
+from uuid import uuid4
+
+import pandas as pd
+
+ARCHIVE_DIR = "archive"
+HOT_DAYS = int(os.environ.get("HOT_DAYS", "90"))
+# 读过的分区在进程里缓存，所有空间共用这个上限（不含 SPACE_CACHE 的部分）
+ARCHIVE_CACHE_BYTES = int(os.environ.get("ARCHIVE_CACHE_MB", "64")) * 2**20
+
+
+# ---------------- 分区 ----------------
+def _partition_path(root, month):
+    return Path(root) / ARCHIVE_DIR / f"records-{month}.csv.gz"
+
+
+def _atomic_csv(df, path, **kwargs):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid4().hex}.tmp")
+    df.to_csv(tmp, index=False, encoding="utf-8-sig", **kwargs)
+    os.replace(tmp, path)
+
+
+def list_partitions(root="."):
+    d = Path(root) / ARCHIVE_DIR
+    if not d.exists():
+        return []
+    return sorted(p.name[len("records-"):-len(".csv.gz")] for p in d.glob("records-*.csv.gz"))
+
+
+class PartitionCache:
+    # 按字节数限制的 LRU，键是（数据目录, 月份），文件 mtime 变了自动失效。
+    # 顺序扫描全部分区时，不淘汰本次扫描刚读过的分区：放不下的就不缓存，
+    # 这样反复扫描至少能命中缓存得下的那部分，而不是每次都从头挤掉、命中率为 0。
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()   # (目录, 月份) -> {"mtime_ns", "df", "bytes", "scan"}
+        self.bytes = 0
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+
+    def read(self, root, month, scan=None):
+        path = _partition_path(root, month)
+        mtime_ns = path.stat().st_mtime_ns
+        key = (str(Path(root).resolve()), month)
+        with self.lock:
+            e = self.entries.get(key)
+            if e is not None and e["mtime_ns"] == mtime_ns:
+                e["scan"] = scan
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return e["df"]
+            self.misses += 1
+        df = pd.read_csv(path, encoding="utf-8-sig", compression="gzip")
+        size = int(df.memory_usage(deep=True).sum())
+        with self.lock:
+            self._forget(key)
+            for k in list(self.entries):
+                if self.bytes + size <= self.max_bytes:
+                    break
+                if scan is None or self.entries[k]["scan"] is not scan:
+                    self._forget(k)
+            if self.bytes + size <= self.max_bytes:
+                self.entries[key] = {"mtime_ns": mtime_ns, "df": df, "bytes": size, "scan": scan}
+                self.bytes += size
+        return df
+
+    def _forget(self, key):
+        e = self.entries.pop(key, None)
+        if e is not None:
+            self.bytes -= e["bytes"]
+
+    def forget(self, root, month):
+        with self.lock:
+            self._forget((str(Path(root).resolve()), month))
+
+
+PARTITIONS = PartitionCache(ARCHIVE_CACHE_BYTES)
+
+
+def _months(root, start=None, end=None):
+    months = list_partitions(root)
+    if start is not None:
+        months = [m for m in months if m >= pd.Timestamp(start).strftime("%Y-%m")]
+    if end is not None:
+        months = [m for m in months if m <= pd.Timestamp(end).strftime("%Y-%m")]
+    return months
+
+
+def archive_bytes(root=".", start=None, end=None):
+    # 范围内分区的压缩后大小，不读内容
+    return sum(_partition_path(root, m).stat().st_size for m in _months(root, start, end))
+
+
+def iter_archive(root=".", start=None, end=None):
+    # 一次一个月，调用方不需要整份历史同时在内存里
+    scan = object()
+    for m in _months(root, start, end):
+        yield PARTITIONS.read(root, m, scan)
+
+
+def load_archive(root=".", start=None, end=None, exclude_ids=()):
+    parts = list(iter_archive(root, start, end))
+    if not parts:
+        return pd.DataFrame()
+    df = pd.concat(parts, ignore_index=True)
+    # 搬迁中途出错或旧会话把老记录写回了 data.csv 时，以热数据为准
+    if len(exclude_ids):
+        df = df[~df["记录ID"].isin(exclude_ids)]
+    return df
+
+
+def iter_with_archive(hot, root=".", start=None, end=None):
+    # with_archive 的分块版本（导出等整表扫描用）：逐月给出归档，最后给热数据
+    hot_ids = set(hot["记录ID"]) if "记录ID" in hot.columns else set()
+    for part in iter_archive(root, start, end):
+        yield part[~part["记录ID"].isin(hot_ids)] if hot_ids else part
+    yield hot
+
+
+def with_archive(hot, root=".", start=None, end=None):
+    hot_ids = set(hot["记录ID"]) if "记录ID" in hot.columns else set()
+    arch = load_archive(root, start, end, exclude_ids=hot_ids)
+    if arch.empty:
+        return hot
+    if hot.columns.empty:
+        return arch
+    return pd.concat([arch.reindex(columns=hot.columns), hot], ignore_index=True)
+
+
+def remove_archived(root=".", ids=()):
+    # 删除记录、或二次评级把旧记录搬回热数据时，从所在分区里去掉；返回被去掉的行
+    ids = set(ids)
+    removed = []
+    for m in list_partitions(root) if ids else []:
+        df = PARTITIONS.read(root, m)
+        hit = df["记录ID"].isin(ids)
+        if not hit.any():
+            continue
+        removed.append(df[hit])
+        p = _partition_path(root, m)
+        if hit.all():
+            p.unlink()
+        else:
+            _atomic_csv(df[~hit], p, compression="gzip")
+        PARTITIONS.forget(root, m)
+    return pd.concat(removed, ignore_index=True) if removed else pd.DataFrame()
+
+
+# ---------------- 搬迁 ----------------
+def retier(root=".", hot_days=HOT_DAYS, data_name="data.csv"):
+    path = Path(root) / data_name
+    if not path.exists():
+        return 0
+    df = pd.read_csv(path, encoding="utf-8-sig")
+    if "记录ID" not in df.columns:
+        df["记录ID"] = ""
+    df["记录ID"] = df["记录ID"].apply(lambda x: x if isinstance(x, str) and x.strip() else uuid4().hex)
+
+    t = pd.to_datetime(df["时间"], errors="coerce")
+    # 时间解析不了的留在热数据里
+    cold = t < pd.Timestamp.now() - pd.Timedelta(days=hot_days)
+    if not cold.any():
+        return 0
+    # 先写归档再写热数据：中途失败最多是两边都有，读的时候会去重
+    for month, part in df[cold].groupby(t[cold].dt.strftime("%Y-%m")):
+        p = _partition_path(root, month)
+        if p.exists():
+            old = pd.read_csv(p, encoding="utf-8-sig", compression="gzip")
+            part = pd.concat([old, part], ignore_index=True).drop_duplicates("记录ID", keep="last")
+        _atomic_csv(part, p, compression="gzip")
+    _atomic_csv(df[~cold], path)
+    return int(cold.sum())
+
+
+def maybe_retier(root=".", hot_days=HOT_DAYS):
+    # 每天最多自动搬一次，避免每次加载都整表重写
+    marker = Path(root) / ARCHIVE_DIR / ".last_tier"
+    today = date.today().isoformat()
+    if marker.exists() and marker.read_text(encoding="utf-8").strip() == today:
+        return 0
+    moved = retier(root, hot_days)
+    marker.parent.mkdir(parents=True, exist_ok=True)
+    marker.write_text(today, encoding="utf-8")
+    return moved
+
+
+# ---------------- 命令行 ----------------
+def main(argv=None):
+    p = argparse.ArgumentParser(description="把旧记录按月归档到 archive/，data.csv 只留热数据")
+    p.add_argument("--root", default=".", help="数据目录")
+    p.add_argument("--days", type=int, default=HOT_DAYS, help="超过多少天算旧记录")
+    p.add_argument("--all-spaces", action="store_true", help="同时处理 spaces/ 下的所有空间")
+    args = p.parse_args(argv)
+
+    roots = [Path(args.root)]
+    if args.all_spaces:
+        from spaces import get_space, list_spaces
+        roots += [get_space(name).root for name in list_spaces()]
+    for root in roots:
+        moved = retier(root, args.days)
+        print(f"{root}：归档 {moved} 条，现有分区 {len(list_partitions(root))} 个")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# xlsx_cache.py
+# 给 data.xlsx 配一个二进制旁路缓存（pickle），openpyxl 不再出现在每次读写里。
+#   读：xlsx 的 mtime/大小（必要时再比 sha256）和缓存记录一致就直接读缓存；
+#       不一致说明有人手动改了表格，重新读 xlsx 并刷新缓存。
+#   写：只写缓存（缓存就是完整数据），xlsx 在后台延迟重新生成，导出前也会强制生成。
+#   另有一份保存记录（时间/行数）只用于排查，不会拿来恢复数据。
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from uuid import uuid4
+
+import pandas as pd
+
+FLUSH_DELAY = 2.0   # 秒；连续保存只会触发一次 xlsx 重写
+
+_timers = {}
+_locks = {}
+_registry_lock = threading.Lock()   # 只保护 _timers / _locks 两个字典
+
+
+def _lock_for(xlsx):
+    # 每个表格一把锁，不同空间的表格互不等待；
+    # 可重入：read_frame 持锁时还会调用 schedule_flush
+    key = str(Path(xlsx).resolve())
+    with _registry_lock:
+        return _locks.setdefault(key, threading.RLock())
+
+
+# ---------------- 路径 / 元数据 ----------------
+def _sidecar(xlsx):
+    xlsx = Path(xlsx)
+    return xlsx.with_name(f".{xlsx.name}.pkl")
+
+
+def _meta_path(xlsx):
+    xlsx = Path(xlsx)
+    return xlsx.with_name(f".{xlsx.name}.meta.json")
+
+
+def _save_log(xlsx):
+    xlsx = Path(xlsx)
+    return xlsx.with_name(f".{xlsx.name}.saves.log")
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _xlsx_stat(xlsx):
+    st = Path(xlsx).stat()
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+def _load_meta(xlsx):
+    try:
+        with open(_meta_path(xlsx), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_meta(xlsx, meta):
+    path = _meta_path(xlsx)
+    tmp = path.with_name(f"{path.name}.{uuid4().hex}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, path)
+
+
+def _write_sidecar(df, xlsx):
+    path = _sidecar(xlsx)
+    tmp = path.with_name(f"{path.name}.{uuid4().hex}.tmp")
+    df.to_pickle(tmp)
+    os.replace(tmp, path)
+
+
+# ---------------- 读 ----------------
+def has_frame(xlsx):
+    return Path(xlsx).exists() or _sidecar(xlsx).exists()
+
+
+def _next_version(meta):
+    # 缓存每写一次加一；flush 据此判断写 xlsx 期间缓存有没有被改过
+    return (meta or {}).get("version", 0) + 1
+
+
+def _refresh_from_xlsx(xlsx):
+    df = pd.read_excel(xlsx, engine="openpyxl")
+    _write_sidecar(df, xlsx)
+    _save_meta(xlsx, {**_xlsx_stat(xlsx), "sha256": _sha256(xlsx), "dirty": False,
+                      "version": _next_version(_load_meta(xlsx))})
+    _save_log(xlsx).unlink(missing_ok=True)
+    return df
+
+
+def read_frame(xlsx):
+    # 和 flush / write_frame 互斥：否则可能读到写了一半的元数据，或把刚写的缓存当成冲突备份
+    xlsx = Path(xlsx).resolve()
+    with _lock_for(xlsx):
+        return _read_frame(xlsx)
+
+
+def _read_frame(xlsx):
+    meta = _load_meta(xlsx)
+    if not xlsx.exists():
+        return pd.read_pickle(_sidecar(xlsx))
+    if meta is None or not _sidecar(xlsx).exists():
+        return _refresh_from_xlsx(xlsx)
+
+    cur = _xlsx_stat(xlsx)
+    if (cur["mtime_ns"], cur["size"]) != (meta["mtime_ns"], meta["size"]):
+        if _sha256(xlsx) != meta["sha256"]:
+            # 表格被手动改过：以 xlsx 为准，未写出的缓存留一份备份
+            if meta.get("dirty"):
+                os.replace(_sidecar(xlsx), xlsx.with_name(f".{xlsx.name}.{datetime.now():%Y%m%d-%H%M%S}.conflict.pkl"))
+            return _refresh_from_xlsx(xlsx)
+        # 只是 mtime 变了（被复制/touch），内容没变
+        _save_meta(xlsx, {**meta, **cur})
+
+    try:
+        df = pd.read_pickle(_sidecar(xlsx))
+    except Exception:
+        # pandas 升级后旧 pickle 读不出来等情况，退回 xlsx
+        return _refresh_from_xlsx(xlsx)
+    if meta.get("dirty"):
+        # 上次进程退出时还没来得及写 xlsx
+        schedule_flush(xlsx)
+    return df
+
+
+# ---------------- 写 ----------------
+def write_frame(df, xlsx):
+    xlsx = Path(xlsx).resolve()
+    with _lock_for(xlsx):
+        _write_sidecar(df, xlsx)
+        meta = _load_meta(xlsx)
+        if meta is None:
+            # 第一次写：当前的 xlsx 就是基准，之后 flush 覆盖它是预期行为
+            meta = {**_xlsx_stat(xlsx), "sha256": _sha256(xlsx)} if xlsx.exists() else {"mtime_ns": 0, "size": -1, "sha256": ""}
+        _save_meta(xlsx, {**meta, "dirty": True, "version": _next_version(meta)})
+        with open(_save_log(xlsx), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"时间": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "行数": len(df)},
+                               ensure_ascii=False) + "\n")
+    schedule_flush(xlsx)
+
+
+def flush(xlsx):
+    # 把缓存重新生成为 xlsx；手动改过的表格不会被覆盖。
+    # openpyxl 写表格很慢（2 万行要好几秒），只在取快照和最后替换时持锁，
+    # 写的过程中 read_frame / write_frame 不用等
+    xlsx = Path(xlsx).resolve()
+    lock = _lock_for(xlsx)
+    with lock:
+        meta = _load_meta(xlsx)
+        if not meta or not meta.get("dirty") or not _sidecar(xlsx).exists():
+            return False
+        base = _xlsx_stat(xlsx) if xlsx.exists() else None
+        if base and (base["mtime_ns"], base["size"]) != (meta["mtime_ns"], meta["size"]) and _sha256(xlsx) != meta["sha256"]:
+            return False
+        df = pd.read_pickle(_sidecar(xlsx))
+        version = meta.get("version", 0)
+
+    tmp = xlsx.with_name(f".{xlsx.name}.{uuid4().hex}.tmp.xlsx")
+    try:
+        df.to_excel(tmp, index=False, engine="openpyxl")
+        # 改名不改 mtime/大小，替换前先算好
+        new = {**_xlsx_stat(tmp), "sha256": _sha256(tmp)}
+        with lock:
+            meta = _load_meta(xlsx)
+            cur = _xlsx_stat(xlsx) if xlsx.exists() else None
+            # 期间又有保存（它会再排一次 flush），或者表格被手动改了：这次作废
+            if not meta or meta.get("version", 0) != version or cur != base:
+                return False
+            os.replace(tmp, xlsx)
+            _save_meta(xlsx, {**new, "dirty": False, "version": version})
+            _save_log(xlsx).unlink(missing_ok=True)
+            return True
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def schedule_flush(xlsx, delay=None):
+    key = str(Path(xlsx).resolve())
+    with _registry_lock:
+        old = _timers.pop(key, None)
+        if old:
+            old.cancel()
+        t = threading.Timer(FLUSH_DELAY if delay is None else delay, flush, args=(xlsx,))
+        t.daemon = True
+        _timers[key] = t
+        t.start()